@@ -0,0 +1,87 @@
+import logging
+from datetime import datetime
+from threading import Condition, Thread
+
+
+class AttemptLog:
+    """
+    Buffer em memória das tentativas de resgate de flags.
+
+    As tentativas são gravadas na tabela `attempts` em INSERTs de várias linhas por uma
+    thread própria, quando o buffer atinge `max_rows` ou a cada `max_delay` segundos.
+    """
+
+    def __init__(self, database, max_rows: int = 500, max_delay: float = 5.0, max_buffer: int = 50000):
+        self.database = database
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_buffer = max_buffer
+
+        self._rows: list[tuple] = []
+        self._closed = False
+        self._condition = Condition()
+        self._thread = Thread(target=self._run, name="fireuai_attempts", daemon=True)
+        self._logger = logging.getLogger("bot_logger")
+
+    def start(self):
+        self._thread.start()
+
+    def record(self, guild_id: str, user_id: str, digest: bytes, result: str, latency_ms: int):
+        """
+        Adiciona uma tentativa ao buffer sem bloquear o chamador.
+
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
+        @type user_id: string
+        @param user_id: Id do usuário do discord.
+        @type digest: bytes
+        @param digest: Digest da flag tentada (o mesmo de `flags.flag_hash`).
+        @type result: string
+        @param result: correct, incorrect, duplicate, expired, unregistered ou error.
+        @type latency_ms: int
+        @param latency_ms: Tempo de processamento do comando em milissegundos.
+        """
+
+        with self._condition:
+            # Se o bd ficar indisponível, descarta as tentativas mais antigas
+            if len(self._rows) >= self.max_buffer:
+                del self._rows[:self.max_rows]
+
+            self._rows.append((guild_id, user_id, digest, result, latency_ms, datetime.now()))
+
+            if len(self._rows) >= self.max_rows:
+                self._condition.notify()
+
+    def close(self):
+        """
+        Grava as tentativas pendentes e encerra a thread.
+        """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or len(self._rows) >= self.max_rows, self.max_delay)
+                rows, self._rows = self._rows, []
+                closed = self._closed
+
+            if rows:
+                try:
+                    self.database.insert_attempts(rows)
+                except Exception:
+                    self._logger.exception(f"Falha ao gravar {len(rows)} tentativas")
+
+                    # Devolve as linhas ao buffer e espera antes de tentar de novo
+                    if not closed:
+                        with self._condition:
+                            self._rows[:0] = rows[-self.max_buffer:]
+                            self._condition.wait_for(lambda: self._closed, self.max_delay)
+
+            if closed:
+                return
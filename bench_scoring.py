@@ -0,0 +1,202 @@
+import random
+import argparse
+from hashlib import sha256
+from time import perf_counter
+from datetime import datetime, timedelta
+
+from config import load_config
+from fireuai_db import FireuaiDB, _DYNAMIC_POINTS_SQL
+
+# Pontos que cada resgate deveria valer com os valores atuais de flag_stats
+_EXPECTED_SQL = f"""
+    SELECT r.user_id, SUM(IF(r.detetime > f.expiration, ROUND(({_DYNAMIC_POINTS_SQL}) / 2), {_DYNAMIC_POINTS_SQL})) AS points
+    FROM rewards r
+    INNER JOIN flags f ON f.id = r.flag_id
+    INNER JOIN flag_stats s ON s.flag_id = f.id
+    WHERE r.guild_id = %(guild_id)s
+    GROUP BY r.user_id
+"""
+
+
+def insert_many(cursor, table: str, columns: tuple[str, ...], rows: list[tuple], batch_size: int = 1000):
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ", ".join([placeholders] * len(batch)),
+            tuple(value for row in batch for value in row)
+        )
+
+
+def cleanup(database: FireuaiDB, guild_id: str):
+    with database.get_connection() as connection:
+        cursor = connection.cursor()
+        for table in ("rewards", "flag_stats", "flags", "users"):
+            cursor.execute(f"DELETE FROM {table} WHERE guild_id = %s;", (guild_id,))
+        connection.commit()
+        cursor.close()
+
+
+def reset_points(cursor, guild_id: str):
+    """Volta todos os desafios ao valor inicial, deixando todos pendentes de recálculo"""
+
+    cursor.execute("UPDATE flags SET points = initial_points WHERE guild_id = %s;", (guild_id,))
+    cursor.execute("""
+        UPDATE users u
+        INNER JOIN (
+            SELECT r.user_id, SUM(IF(r.detetime > f.expiration, ROUND(f.points / 2), f.points)) AS points
+            FROM rewards r
+            INNER JOIN flags f ON f.id = r.flag_id
+            WHERE r.guild_id = %(guild_id)s
+            GROUP BY r.user_id
+        ) t ON u.guild_id = %(guild_id)s AND u.id = t.user_id
+        SET u.points = t.points;
+    """, {"guild_id": guild_id})
+
+
+def setup(database: FireuaiDB, guild_id: str, users: int, flags: int, solve_rate: float, seed: int) -> list[int]:
+    rng = random.Random(seed)
+    user_ids = [f"bench{i}" for i in range(users)]
+    expiration = datetime.now().replace(microsecond=0)
+
+    with database.get_connection() as connection:
+        cursor = connection.cursor()
+
+        insert_many(cursor, "users", ("guild_id", "id", "nickname"), [(guild_id, user, user) for user in user_ids])
+
+        insert_many(
+            cursor, "flags",
+            ("guild_id", "flag_hash", "points", "name", "creator", "expiration",
+             "dynamic", "initial_points", "minimum_points", "decay"),
+            [
+                (guild_id, sha256(f"{guild_id}-{j}".encode()).digest(), 500, f"bench-{j}", "bench", expiration,
+                 1, 500, 100, max(int(users * solve_rate), 1))
+                for j in range(flags)
+            ]
+        )
+
+        cursor.execute("SELECT id FROM flags WHERE guild_id = %s ORDER BY id;", (guild_id,))
+        flag_ids = [row[0] for row in cursor.fetchall()]
+
+        # Cerca de 10% dos resgates são feitos depois da validade e valem metade
+        stats = []
+        for flag_id in flag_ids:
+            solvers = rng.sample(user_ids, rng.randint(1, max(int(2 * users * solve_rate), 1)))
+            insert_many(
+                cursor, "rewards", ("guild_id", "user_id", "flag_id", "detetime"),
+                [(guild_id, user, flag_id, expiration + timedelta(hours=rng.uniform(-9, 1))) for user in solvers]
+            )
+            stats.append((guild_id, flag_id, len(solvers), len(solvers)))
+
+        insert_many(cursor, "flag_stats", ("guild_id", "flag_id", "solves", "player_solves"), stats)
+        reset_points(cursor, guild_id)
+
+        connection.commit()
+        cursor.close()
+
+    return flag_ids
+
+
+def mismatches(database: FireuaiDB, guild_id: str) -> int:
+    with database.get_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*)
+            FROM users u
+            INNER JOIN ({_EXPECTED_SQL}) e ON u.id = e.user_id
+            WHERE u.guild_id = %(guild_id)s AND u.points != e.points;
+        """, {"guild_id": guild_id})
+        result = cursor.fetchone()[0]
+        cursor.close()
+
+    return result
+
+
+def naive_rescore(database: FireuaiDB, guild_id: str):
+    """Recalcula usuário por usuário, como seria sem o UPDATE em conjunto"""
+
+    with database.get_connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT id FROM users WHERE guild_id = %s;", (guild_id,))
+
+        for (user_id,) in cursor.fetchall():
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(IF(r.detetime > f.expiration, ROUND(({_DYNAMIC_POINTS_SQL}) / 2), {_DYNAMIC_POINTS_SQL})), 0)
+                FROM rewards r
+                INNER JOIN flags f ON f.id = r.flag_id
+                INNER JOIN flag_stats s ON s.flag_id = f.id
+                WHERE r.guild_id = %s AND r.user_id = %s;
+            """, (guild_id, user_id))
+            points = cursor.fetchone()[0]
+            cursor.execute("UPDATE users SET points = %s WHERE guild_id = %s AND id = %s;", (points, guild_id, user_id))
+
+        cursor.execute(f"""
+            UPDATE flags f
+            INNER JOIN flag_stats s ON s.flag_id = f.id
+            SET f.points = {_DYNAMIC_POINTS_SQL}
+            WHERE f.guild_id = %s;
+        """, (guild_id,))
+
+        connection.commit()
+        cursor.close()
+
+
+def timed(label: str, func, *args):
+    started = perf_counter()
+    result = func(*args)
+    print(f"{label}: {(perf_counter() - started) * 1000:.0f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o recálculo da pontuação dinâmica em um servidor fictício.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--flags", type=int, default=500)
+    parser.add_argument("--solve-rate", type=float, default=0.1, help="Fração média de usuários que resolve cada desafio")
+    parser.add_argument("--burst", type=int, default=50, help="Desafios resolvidos na rajada")
+    parser.add_argument("--guild", default="bench-scoring", help="guild_id usado pelos dados do benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Não apaga os dados ao terminar")
+    parser.add_argument("--naive", action="store_true", help="Também mede o recálculo usuário por usuário")
+    args = parser.parse_args()
+
+    database = FireuaiDB.from_config(load_config())
+    cleanup(database, args.guild)
+
+    try:
+        flag_ids = timed(f"setup ({args.users} usuários x {args.flags} desafios)", setup, database, args.guild,
+                         args.users, args.flags, args.solve_rate, args.seed)
+
+        adjusted = timed("rescore_flags (todos os desafios)", database.rescore_flags, flag_ids)
+        print(f"  {adjusted} usuários ajustados, {mismatches(database, args.guild)} divergências")
+
+        # Rajada: alguns desafios ganham novos resgates desde o último recálculo
+        burst = random.Random(args.seed).sample(flag_ids, min(args.burst, len(flag_ids)))
+        with database.get_connection() as connection:
+            cursor = connection.cursor()
+            in_ids = ", ".join(["%s"] * len(burst))
+            cursor.execute(f"UPDATE flag_stats SET solves = solves + 3, player_solves = player_solves + 3 WHERE flag_id IN ({in_ids});", tuple(burst))
+            connection.commit()
+            cursor.close()
+
+        adjusted = timed(f"rescore_flags (rajada de {len(burst)} desafios)", database.rescore_flags, burst)
+        print(f"  {adjusted} usuários ajustados, {mismatches(database, args.guild)} divergências")
+
+        if args.naive:
+            with database.get_connection() as connection:
+                cursor = connection.cursor()
+                reset_points(cursor, args.guild)
+                connection.commit()
+                cursor.close()
+
+            timed("recálculo usuário por usuário (todos os desafios)", naive_rescore, database, args.guild)
+            print(f"  {mismatches(database, args.guild)} divergências")
+
+    finally:
+        if not args.keep:
+            cleanup(database, args.guild)
+
+
+if __name__ == "__main__":
+    main()
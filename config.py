@@ -0,0 +1,142 @@
+import os
+import json
+from dataclasses import dataclass, fields
+from dotenv import dotenv_values
+
+
+@dataclass(frozen=True)
+class Config:
+    """
+    Configuração do bot lida do `.env` e do arquivo de configuração (JSON).
+    Valores do arquivo sobrepõem os do ambiente; cada campo tem a variável de ambiente em `env`.
+    """
+
+    dc_key: str | None = None
+    prefix_commands: bool = True
+    sync_commands: bool = False
+    db_user: str | None = None
+    db_password: str | None = None
+    db_name: str | None = None
+    db_host: str = "localhost"
+    db_replicas: tuple[str, ...] = ()
+    pool_size: int = 10
+    max_lag: float = 5.0
+    sticky_window: float = 10.0
+    webhook_url: str | None = None
+    flag_salt: str | None = None
+    hint_price_basic: int = 1000
+    hint_price_plus: int = 2000
+    late_days: int = 7
+    ranking_ttl: float = 30.0
+    sharing_channel: str | None = None
+    sharing_window: float = 30.0
+    sharing_min_cluster: int = 3
+
+
+# Variável de ambiente de cada campo
+ENV_NAMES = {
+    "dc_key": "DC_KEY",
+    "prefix_commands": "DC_PREFIX_COMMANDS",
+    "sync_commands": "DC_SYNC_COMMANDS",
+    "db_user": "DB_USERNAME",
+    "db_password": "DB_PASSWORD",
+    "db_name": "DB_DATABASE",
+    "db_host": "DB_HOST",
+    "db_replicas": "DB_REPLICAS",
+    "pool_size": "DB_POOL_SIZE",
+    "max_lag": "DB_MAX_LAG",
+    "sticky_window": "DB_STICKY_WINDOW",
+    "webhook_url": "URL_WEBHOOK",
+    "flag_salt": "FLAG_SALT",
+    "hint_price_basic": "HINT_PRICE_BASIC",
+    "hint_price_plus": "HINT_PRICE_PLUS",
+    "late_days": "LATE_DAYS",
+    "ranking_ttl": "RANKING_TTL",
+    "sharing_channel": "DC_SHARING_CHANNEL",
+    "sharing_window": "SHARING_WINDOW",
+    "sharing_min_cluster": "SHARING_MIN_CLUSTER",
+}
+
+# Campos que só têm efeito após reiniciar o bot (conexão com o gateway, digest das flags e sincronização inicial)
+RESTART_FIELDS = {"dc_key", "prefix_commands", "sync_commands", "flag_salt"}
+
+# Campos que exigem recriar os pools de conexão
+POOL_FIELDS = {"db_user", "db_password", "db_name", "db_host", "db_replicas", "pool_size"}
+
+
+def _convert(name: str, value):
+    default = Config.__dataclass_fields__[name].default
+
+    if isinstance(default, bool):
+        return value if isinstance(value, bool) else str(value).strip().lower() in ("1", "true", "yes")
+    if isinstance(default, tuple):
+        if isinstance(value, str):
+            return tuple(item.strip() for item in value.split(",") if item.strip())
+        return tuple(value)
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+ENV_FILE = ".env"
+
+
+def _environment() -> dict[str, str]:
+    # Como no load_dotenv, variáveis exportadas no processo têm prioridade sobre o .env,
+    # que é relido a cada chamada para que alterações nele também sejam recarregadas
+    dotenv = {name: value for name, value in dotenv_values(ENV_FILE).items() if value is not None}
+    return {**dotenv, **os.environ}
+
+
+def config_paths(environment: dict[str, str] | None = None) -> tuple[str, str]:
+    """
+    Caminhos do `.env` e do arquivo de configuração (FIREUAI_CONFIG do ambiente ou do `.env`,
+    padrão `config.json`).
+
+    @rtype: Tupla
+    """
+
+    environment = _environment() if environment is None else environment
+    return ENV_FILE, environment.get("FIREUAI_CONFIG", "config.json")
+
+
+def load_config() -> Config:
+    """
+    Lê a configuração atual do arquivo de configuração, do ambiente e do `.env`, nesta ordem de prioridade.
+
+    @rtype: Config
+    @raise ValueError: Caso o arquivo tenha campos desconhecidos ou valores inválidos
+    """
+
+    environment = _environment()
+    _, file_path = config_paths(environment)
+
+    values = {}
+    for name, env_name in ENV_NAMES.items():
+        if environment.get(env_name):
+            values[name] = _convert(name, environment[env_name])
+
+    if os.path.exists(file_path):
+        with open(file_path, encoding="utf-8") as file:
+            overrides = json.load(file)
+
+        unknown = set(overrides) - {field.name for field in fields(Config)}
+        if unknown:
+            raise ValueError(f"Campos desconhecidos em {file_path}: {', '.join(sorted(unknown))}")
+
+        for name, value in overrides.items():
+            values[name] = _convert(name, value)
+
+    return Config(**values)
+
+
+def changed_fields(old: Config, new: Config) -> set[str]:
+    """
+    Obtém os nomes dos campos que mudaram entre duas configurações.
+
+    @rtype: Conjunto de strings
+    """
+
+    return {field.name for field in fields(Config) if getattr(old, field.name) != getattr(new, field.name)}
@@ -1,19 +1,300 @@
+import asyncio
+import inspect
 from abc import ABC
+from random import shuffle
+from functools import partial, wraps
+from threading import Lock, Timer
+from time import monotonic
+from contextvars import ContextVar
 from mariadb import ConnectionPool
 
+# Rota da chamada atual: None (primário), "read" (réplica permitida) ou "write" (primário)
+_route: ContextVar[str | None] = ContextVar("fireuai_route", default=None)
+
+
+def _routed(route: str, sticky: str | None):
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = signature.bind(self, *args, **kwargs).arguments.get(sticky) if sticky else None
+
+            # Uma leitura dentro de uma escrita continua no primário
+            if route == "read" and (_route.get() == "write" or (key is not None and self._wrote_recently(key))):
+                token = _route.set("write")
+            else:
+                token = _route.set(route)
+
+            try:
+                result = func(self, *args, **kwargs)
+            finally:
+                _route.reset(token)
+
+            if route == "write" and key is not None:
+                self._mark_write(key)
+
+            return result
+        return wrapper
+    return decorator
+
+
+def read_only(sticky: str | None = None):
+    """
+    Marca um método como leitura, que pode ser servido por uma réplica.
+
+    @type sticky: string ou None
+    @param sticky: Parâmetro que identifica o usuário; logo após uma escrita dele a leitura vai ao primário.
+    """
+
+    return _routed("read", sticky)
+
+
+def write(sticky: str | None = None):
+    """
+    Marca um método como escrita, sempre executado no primário.
+
+    @type sticky: string ou None
+    @param sticky: Parâmetro que identifica o usuário cujas próximas leituras devem ir ao primário.
+    """
+
+    return _routed("write", sticky)
+
+
+def coalesce(func):
+    """
+    Marca um método de leitura cujas chamadas concorrentes idênticas (mesmo método e argumentos)
+    podem ser agrupadas em uma única consulta por Database.run. Os chamadores compartilham o mesmo
+    resultado, que não deve ser modificado. Chamadas diretas ao método não são agrupadas.
+    """
+
+    func.coalesced = True
+    return func
+
+
+def _split_host(address: str) -> tuple[str, int]:
+    host, _, port = address.partition(":")
+    return host, int(port) if port else 3306
+
 
 class Database(ABC):
-    def __init__(self, host: str, user: str, password: str, database: str):
-        self.__pool = ConnectionPool(
-            pool_name="fireuai_pool",
-            pool_size=10,
-            host=host,
-            user=user,
-            password=password,
-            database=database
+    def __init__(self, host: str, user: str, password: str, database: str, replicas: list[str] | None = None,
+                 max_lag: float = 5.0, sticky_window: float = 10.0, pool_size: int = 10):
+        # Os pools só são criados em connect(), chamado na inicialização ou na primeira consulta
+        self.__config = {"host": host, "user": user, "password": password, "database": database}
+        self.__replica_hosts = list(replicas or [])
+        self.pool_size = pool_size
+        self.__pool = None
+        self.__replicas = []
+        self.__generation = 0
+        self.__connect_lock = Lock()
+
+        # Atraso máximo aceito de uma réplica e por quanto tempo um usuário lê do primário após escrever
+        self.max_lag = max_lag
+        self.sticky_window = sticky_window
+
+        self.__lag: dict[str, tuple[float | None, float]] = {}
+        self.__recent_writes: dict[str, float] = {}
+        self.__lock = Lock()
+
+        # Chamadas em andamento de métodos com @coalesce e contadores (chamadas, consultas) por método
+        self._flights: dict[tuple, asyncio.Future] = {}
+        self._coalesce_stats: dict[str, list[int]] = {}
+        self._flights_lock = Lock()
+
+    def coalesce_stats(self) -> dict[str, dict]:
+        """
+        Obtém as métricas de agrupamento dos métodos com @coalesce.
+
+        @rtype: Dicionário
+        @return: Por método, o total de chamadas, de consultas executadas e a razão chamadas/consultas
+        """
+
+        with self._flights_lock:
+            return {
+                name: {"calls": calls, "queries": queries, "ratio": calls / queries if queries else 0.0}
+                for name, (calls, queries) in self._coalesce_stats.items()
+            }
+
+    async def run(self, executor, func, *args, **kwargs):
+        """
+        Executa um método bloqueante do bd no executor sem bloquear o event loop.
+        Chamadas concorrentes idênticas de um método com @coalesce aguardam a mesma execução no
+        event loop, de modo que apenas a primeira ocupa uma thread do executor.
+
+        @type executor: concurrent.futures.Executor
+        @param executor: Executor onde as consultas são executadas.
+        @type func: Método do bd
+        @param func: Método a ser executado com os argumentos seguintes.
+        """
+
+        loop = asyncio.get_running_loop()
+        call = partial(func, *args, **kwargs)
+
+        if not getattr(func, "coalesced", False):
+            return await loop.run_in_executor(executor, call)
+
+        name = func.__name__
+        key = (name, args, tuple(sorted(kwargs.items())))
+
+        with self._flights_lock:
+            stats = self._coalesce_stats.setdefault(name, [0, 0])
+            stats[0] += 1
+
+            flight = self._flights.get(key)
+            if flight is None:
+                stats[1] += 1
+                flight = self._flights[key] = loop.run_in_executor(executor, call)
+                flight.add_done_callback(lambda _: self._flights.pop(key, None))
+
+        # O cancelamento de um chamador não cancela a consulta dos demais
+        return await asyncio.shield(flight)
+
+    def _build_pools(self, config: dict, replica_hosts: list[str], pool_size: int):
+        self.__generation += 1
+        primary_host, primary_port = _split_host(config["host"])
+
+        # O primário é criado antes das réplicas: se ele falhar, nenhum pool fica aberto
+        pool = ConnectionPool(
+            pool_name=f"fireuai_pool_{self.__generation}",
+            pool_size=pool_size,
+            host=primary_host,
+            port=primary_port,
+            user=config["user"],
+            password=config["password"],
+            database=config["database"]
         )
 
+        # Uma réplica indisponível não impede a inicialização; as leituras vão ao primário
+        replicas = []
+        for index, address in enumerate(replica_hosts):
+            replica_host, replica_port = _split_host(address)
+            try:
+                replicas.append(ConnectionPool(
+                    pool_name=f"fireuai_replica_{self.__generation}_{index}",
+                    pool_size=pool_size,
+                    host=replica_host,
+                    port=replica_port,
+                    user=config["user"],
+                    password=config["password"],
+                    database=config["database"]
+                ))
+            except Exception:
+                continue
+
+        return pool, replicas
+
+    def connect(self):
+        """
+        Cria os pools de conexão do primário e das réplicas, caso ainda não existam.
+        Falhas de conexão são propagadas para que o chamador possa tentar novamente.
+
+        @rtype: None
+        """
+
+        with self.__connect_lock:
+            if self.__pool is not None:
+                return
+
+            self.__pool, self.__replicas = self._build_pools(self.__config, self.__replica_hosts, self.pool_size)
+
+    def reconfigure(self, host: str, user: str, password: str, database: str, replicas: list[str] | None,
+                    pool_size: int, grace: float = 30.0):
+        """
+        Cria novos pools com a configuração informada e os troca pelos atuais de uma vez.
+        Os pools antigos são fechados após `grace` segundos, quando as consultas em andamento já terminaram.
+        Se a conexão falhar, a exceção é propagada e os pools atuais continuam em uso.
+
+        @rtype: None
+        """
+
+        config = {"host": host, "user": user, "password": password, "database": database}
+        replica_hosts = list(replicas or [])
+
+        with self.__connect_lock:
+            pool, replica_pools = self._build_pools(config, replica_hosts, pool_size)
+
+            old_pools = ([self.__pool] if self.__pool is not None else []) + self.__replicas
+
+            self.__config = config
+            self.__replica_hosts = replica_hosts
+            self.pool_size = pool_size
+            self.__pool, self.__replicas = pool, replica_pools
+
+        def close_old_pools():
+            for old_pool in old_pools:
+                try:
+                    old_pool.close()
+                except Exception:
+                    pass
+
+        timer = Timer(grace, close_old_pools)
+        timer.daemon = True
+        timer.start()
+
+    def _mark_write(self, key: str):
+        now = monotonic()
+
+        with self.__lock:
+            if len(self.__recent_writes) > 10000:
+                self.__recent_writes = {k: t for k, t in self.__recent_writes.items() if t > now}
+            self.__recent_writes[key] = now + self.sticky_window
+
+    def _wrote_recently(self, key: str) -> bool:
+        with self.__lock:
+            return self.__recent_writes.get(key, 0) > monotonic()
+
+    def _replica_lag(self, pool: ConnectionPool) -> float | None:
+        """
+        Obtém o atraso da réplica em segundos, consultado no máximo uma vez por segundo.
+
+        @rtype: float ou None
+        @return: Segundos de atraso ou None caso a replicação não esteja ativa
+        """
+
+        now = monotonic()
+
+        with self.__lock:
+            lag, checked_at = self.__lag.get(pool.pool_name, (None, 0.0))
+        if now - checked_at < 1.0:
+            return lag
+
+        lag = None
+        try:
+            with pool.get_connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                try:
+                    cursor.execute("SHOW SLAVE STATUS;")
+                    status = cursor.fetchone()
+                finally:
+                    cursor.close()
+            if status and status.get("Seconds_Behind_Master") is not None:
+                lag = float(status["Seconds_Behind_Master"])
+        except Exception:
+            pass
+
+        with self.__lock:
+            self.__lag[pool.pool_name] = (lag, now)
+
+        return lag
+
     def get_connection(self):
+        if self.__pool is None:
+            self.connect()
+
+        if _route.get() == "read" and self.__replicas:
+            replicas = self.__replicas.copy()
+            shuffle(replicas)
+
+            for pool in replicas:
+                lag = self._replica_lag(pool)
+                if lag is None or lag > self.max_lag:
+                    continue
+                try:
+                    return pool.get_connection()
+                except Exception:
+                    continue
+
         return self.__pool.get_connection()
 
     def _execute(self, sql: str, params: dict | tuple | None = (None,), _dict: bool = False):
@@ -27,3 +308,33 @@ class Database(ABC):
             finally:
                 cursor.close()
             return result
+
+    def _stream(self, sql: str, params: dict | tuple | None = (None,), _dict: bool = False, chunk_size: int = 1000):
+        """
+        Executa uma consulta com cursor não bufferizado, lendo as linhas do servidor em blocos.
+        A conexão é obtida na chamada (respeitando a rota atual) e liberada ao fim da iteração.
+
+        @rtype: Gerador de Listas
+        @return: Blocos de até `chunk_size` linhas
+        """
+
+        connection = self.get_connection()
+        try:
+            cursor = connection.cursor(dictionary=_dict, buffered=False)
+            cursor.execute(sql, params)
+        except Exception as e:
+            connection.close()
+            raise e
+
+        def chunks():
+            try:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+                connection.close()
+
+        return chunks()
@@ -0,0 +1,118 @@
+import io
+import csv
+import gzip
+import json
+import argparse
+
+# Tipos de exportação suportados e o método do FireuaiDB que gera as linhas
+EXPORTS = {
+    "scoreboard": "iter_scoreboard",
+    "event": "iter_event_results",
+    "rewards": "iter_rewards",
+}
+
+FORMATS = ("csv", "jsonl")
+
+
+def write_export(chunks, fileobj, fmt: str) -> int:
+    """
+    Escreve os blocos de linhas em um arquivo comprimido com gzip, um bloco por vez.
+
+    @type chunks: Iterável de Listas de Dicionários
+    @param chunks: Blocos retornados por um dos métodos iter_* do FireuaiDB.
+    @type fileobj: Arquivo binário
+    @param fileobj: Destino da exportação.
+    @type fmt: string
+    @param fmt: csv ou jsonl.
+
+    @rtype: int
+    @return: Quantidade de linhas exportadas
+    """
+
+    total = 0
+
+    with gzip.GzipFile(fileobj=fileobj, mode="wb") as compressed:
+        text = io.TextIOWrapper(compressed, encoding="utf-8", newline="")
+        writer = None
+
+        for rows in chunks:
+            if fmt == "csv":
+                if writer is None:
+                    writer = csv.DictWriter(text, fieldnames=list(rows[0].keys()))
+                    writer.writeheader()
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    text.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+
+            total += len(rows)
+
+        text.flush()
+        text.detach()
+
+    return total
+
+
+def export(database, kind: str, guild_id: str, fmt: str, fileobj, event_name: str | None = None) -> int:
+    """
+    Exporta o placar, o resultado de um evento ou o histórico de resgates de um servidor.
+
+    @type database: FireuaiDB
+    @param database: Banco de onde as linhas serão lidas.
+    @type kind: string
+    @param kind: scoreboard, event ou rewards.
+    @type guild_id: string
+    @param guild_id: Id do servidor do discord.
+    @type fmt: string
+    @param fmt: csv ou jsonl.
+    @type fileobj: Arquivo binário
+    @param fileobj: Destino da exportação.
+    @type event_name: string ou None
+    @param event_name: Nome do evento, obrigatório quando kind é event.
+
+    @rtype: int
+    @return: Quantidade de linhas exportadas
+    """
+
+    if kind not in EXPORTS:
+        raise ValueError(f"Tipo de exportação inválido: {kind}")
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato de exportação inválido: {fmt}")
+
+    method = getattr(database, EXPORTS[kind])
+
+    if kind == "event":
+        if not event_name:
+            raise ValueError("O nome do evento é obrigatório para exportar um evento")
+        chunks = method(guild_id, event_name)
+    else:
+        chunks = method(guild_id)
+
+    return write_export(chunks, fileobj, fmt)
+
+
+def main():
+    from config import load_config
+    from fireuai_db import FireuaiDB
+
+    parser = argparse.ArgumentParser(description="Exporta placar, eventos e resgates do FireUAI.")
+    parser.add_argument("kind", choices=EXPORTS.keys())
+    parser.add_argument("--guild", required=True, help="Id do servidor do discord")
+    parser.add_argument("--event", help="Nome do evento (para kind=event)")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--output", help="Arquivo de saída (padrão: <kind>.<format>.gz)")
+    args = parser.parse_args()
+
+    database = FireuaiDB.from_config(load_config())
+
+    output = args.output or f"{args.kind}.{args.format}.gz"
+
+    with open(output, "wb") as fileobj:
+        total = export(database, args.kind, args.guild, args.format, fileobj, args.event)
+
+    print(f"{total} linhas exportadas para {output}.")
+
+
+if __name__ == "__main__":
+    main()
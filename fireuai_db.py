@@ -1,46 +1,375 @@
-from json import dumps
+import hmac
+from json import dumps, loads
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
 from requests import post
-from database import Database
+from config import POOL_FIELDS, Config
+from database import Database, coalesce, read_only, write
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+
+def normalize_flag(flag: str) -> str:
+    """
+    Normaliza a string de uma flag antes do hash (remove espaços das pontas).
+
+    @type flag: string
+    @param flag: String da flag informada pelo usuário.
+    @rtype: string
+    """
+
+    return flag.strip()
+
+
+def hash_flag(flag: str, salt: str | None = None) -> bytes:
+    """
+    Calcula o digest de 32 bytes armazenado em `flags.flag_hash`.
+
+    @type flag: string
+    @param flag: String da flag a ser resumida.
+    @type salt: string ou None
+    @param salt: Segredo da instalação; quando definido é usado HMAC-SHA256.
+    @rtype: bytes
+    """
+
+    data = normalize_flag(flag).encode("utf-8")
+
+    if salt:
+        return hmac.new(salt.encode("utf-8"), data, sha256).digest()
+
+    return sha256(data).digest()
+
+
+# Pontos de cada usuário em um evento: resgates ativos mais os totais dos desafios arquivados
+_EVENT_POINTS_SQL = """
+    SELECT r.user_id, f.points, 1 AS solves
+    FROM rewards r
+    INNER JOIN flags f ON r.flag_id = f.id
+    INNER JOIN event e ON f.event_id = e.id
+    WHERE r.guild_id = %(guild_id)s AND e.guild_id = %(guild_id)s AND e.name = %(event_name)s
+    UNION ALL
+    SELECT s.user_id, s.total_points, s.solves
+    FROM event_user_totals s
+    INNER JOIN event e ON s.event_id = e.id
+    WHERE s.guild_id = %(guild_id)s AND e.guild_id = %(guild_id)s AND e.name = %(event_name)s
+"""
+
+
+# Valor atual de um desafio dinâmico (como no CTFd): cai com o quadrado dos resgates após o primeiro,
+# de `initial_points` até `minimum_points` depois de `decay` resgates (f = flags, s = flag_stats);
+# como no first blood, resgates de administradores não contam
+# (inteiro, para que ROUND(valor / 2) arredonde como nos resgates em atraso de reward_flag)
+_DYNAMIC_POINTS_SQL = """
+    CAST(GREATEST(f.minimum_points, CEIL(
+        f.initial_points - (f.initial_points - f.minimum_points) * POW(GREATEST(s.player_solves - 1, 0), 2) / POW(f.decay, 2)
+    )) AS SIGNED)
+"""
+
+
+class FlagExpiredError(Exception):
+    """Lançada ao tentar resgatar uma flag cujo prazo de atraso já terminou."""
 
 
 class FireuaiDB(Database):
-    def __init__(self, user, password, database, url):
+    def __init__(self, user, password, database, url, flag_salt: str | None = None,
+                 host: str = "localhost", replicas: list[str] | None = None, pool_size: int = 10,
+                 late_days: int = 7):
         self.url = url
-        super().__init__("localhost", user, password, database)
+        self.flag_salt = flag_salt
+
+        # Dias em que uma flag ainda pode ser resgatada, valendo metade, após a validade
+        self.late_days = late_days
+
+        # Cache das estatísticas por desafio ((servidor, nome) -> solves, first blood)
+        self._flag_stats: dict[tuple[str, str], dict] = {}
+        self._flag_stats_lock = Lock()
+
+        # Usuários registrados (servidor, id) e top 20 de pontos por servidor com sua validade,
+        # já que uma leitura de réplica pode chegar depois da invalidação feita por um resgate
+        self._registered: set[tuple[str, str]] = set()
+        self._rankings: dict[str, tuple[list[dict], float]] = {}
+        self._cache_lock = Lock()
+        self.ranking_ttl = 30.0
+
+        # Webhooks são enviados em segundo plano, sem ocupar as threads do bd
+        self._notifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fireuai_webhook")
+
+        # Desafios dinâmicos resolvidos desde o último recálculo (rescore_pending)
+        self._pending_scores: set[int] = set()
+
+        # Funções chamadas após cada resgate confirmado com
+        # (guild_id, flag_id, desafio, user_id, timestamp do resgate)
+        self.reward_listeners: list = []
+
+        super().__init__(host, user, password, database, replicas, pool_size=pool_size)
+
+    @classmethod
+    def from_config(cls, config: Config) -> "FireuaiDB":
+        """
+        Cria o acesso ao bd a partir da configuração do bot.
+
+        @type config: Config
+        @param config: Configuração lida por load_config.
+        @rtype: FireuaiDB
+        """
+
+        database = cls(config.db_user, config.db_password, config.db_name, config.webhook_url, config.flag_salt,
+                       config.db_host, list(config.db_replicas), config.pool_size, config.late_days)
+        database.max_lag = config.max_lag
+        database.sticky_window = config.sticky_window
+        database.ranking_ttl = config.ranking_ttl
+
+        return database
+
+    def apply_config(self, config: Config, changed: set[str]):
+        """
+        Aplica uma nova configuração sem reiniciar: recria os pools apenas se a conexão mudou
+        e descarta apenas os caches afetados. O digest das flags (flag_salt) não é alterado.
+
+        @type config: Config
+        @param config: Nova configuração.
+        @type changed: Conjunto de strings
+        @param changed: Campos que mudaram em relação à configuração atual.
+        @rtype: None
+        """
+
+        if changed & POOL_FIELDS:
+            self.reconfigure(config.db_host, config.db_user, config.db_password, config.db_name,
+                             list(config.db_replicas), config.pool_size)
+
+        self.url = config.webhook_url
+        self.late_days = config.late_days
+        self.max_lag = config.max_lag
+        self.sticky_window = config.sticky_window
+
+        if "ranking_ttl" in changed:
+            self.ranking_ttl = config.ranking_ttl
+            with self._cache_lock:
+                self._rankings.clear()
+
+    def _notify(self, payload: dict):
+        """
+        Enfileira uma mensagem para o webhook configurado; o envio ocorre em segundo plano, ignorando falhas.
+
+        @type payload: dict
+        @param payload: Corpo da mensagem no formato do webhook do discord.
+        @rtype: None
+        """
+
+        if not self.url:
+            return
+
+        self._notifier.submit(self._post_webhook, self.url, dumps(payload))
+
+    @staticmethod
+    def _post_webhook(url: str, data: str):
+        try:
+            post(url, headers={"Content-Type": "application/json"}, data=data, timeout=5)
+        except Exception:
+            pass
+
+    def _publish_reward(self, guild_id: str, flag_id: int, challenge_name: str, user_id: str, solved_at: datetime):
+        """
+        Repassa um resgate confirmado aos ouvintes registrados, ignorando falhas.
+
+        @rtype: None
+        """
+
+        for listener in self.reward_listeners:
+            try:
+                listener(guild_id, flag_id, challenge_name, user_id, solved_at.timestamp())
+            except Exception:
+                pass
+
+    # O cache não expira, por isso é carregado do primário: uma réplica atrasada deixaria
+    # solves e first blood desatualizados até o próximo resgate do desafio
+    @coalesce
+    @write()
+    def _get_flag_stats(self, guild_id: str, challenge_name: str) -> dict | None:
+        """
+        Obtém as estatísticas de um desafio, consultando o bd apenas na primeira vez.
+
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
+        @type challenge_name: string
+        @param challenge_name: Nome do desafio.
+
+        @rtype: Dicionário ou None
+        @return: solves, first_blood_user e first_blood_at ou None caso o desafio não exista
+        """
+
+        with self._flag_stats_lock:
+            stats = self._flag_stats.get((guild_id, challenge_name))
+        if stats is not None:
+            return stats
+
+        query_sql = """
+            SELECT solves, first_blood_user, first_blood_at
+            FROM (
+                SELECT f.id, 0 AS archived, COALESCE(s.solves, 0) AS solves, s.first_blood_user, s.first_blood_at
+                FROM flags f
+                LEFT JOIN flag_stats s ON s.flag_id = f.id
+                WHERE f.guild_id = %(guild_id)s AND f.name = %(name)s
+                UNION ALL
+                SELECT f.id, 1 AS archived, COALESCE(s.solves, 0) AS solves, s.first_blood_user, s.first_blood_at
+                FROM flags_archive f
+                LEFT JOIN flag_stats_archive s ON s.flag_id = f.id
+                WHERE f.guild_id = %(guild_id)s AND f.name = %(name)s
+            ) f
+            ORDER BY f.archived ASC, f.id DESC
+            LIMIT 1;
+        """
+
+        result = self._execute(query_sql, {"guild_id": guild_id, "name": challenge_name}, _dict=True)
+        if not result:
+            return None
+
+        with self._flag_stats_lock:
+            # Um resgate concorrente pode ter atualizado o cache durante a consulta
+            return self._flag_stats.setdefault((guild_id, challenge_name), result[0])
+
+    def flag_digest(self, flag: str) -> bytes:
+        """
+        Calcula o digest de uma flag com o segredo desta instalação.
+
+        @type flag: string
+        @param flag: String da flag.
+        @rtype: bytes
+        """
 
-    def user_exists(self, user_id: str) -> bool:
+        return hash_flag(flag, self.flag_salt)
+
+    @write()
+    def warm_flag_stats(self) -> int:
+        """
+        Carrega no cache as estatísticas de todos os desafios ativos, lidas do primário.
+
+        @rtype: int
+        @return: Quantidade de desafios carregados
+        """
+
+        query_sql = """
+            SELECT
+                f.guild_id,
+                f.name,
+                COALESCE(s.solves, 0) AS solves,
+                s.first_blood_user,
+                s.first_blood_at
+            FROM flags f
+            LEFT JOIN flag_stats s ON s.flag_id = f.id;
+        """
+
+        loaded = 0
+        for rows in self._stream(query_sql, _dict=True):
+            with self._flag_stats_lock:
+                for row in rows:
+                    self._flag_stats.setdefault((row.pop("guild_id"), row.pop("name")), row)
+            loaded += len(rows)
+
+        return loaded
+
+    @read_only()
+    def warm_users(self) -> int:
+        """
+        Carrega no cache todos os usuários registrados.
+
+        @rtype: int
+        @return: Quantidade de usuários carregados
+        """
+
+        loaded = 0
+        for rows in self._stream("SELECT guild_id, id FROM users;"):
+            with self._cache_lock:
+                self._registered.update((guild_id, user_id) for guild_id, user_id in rows)
+            loaded += len(rows)
+
+        return loaded
+
+    @read_only()
+    def warm_rankings(self) -> int:
+        """
+        Carrega no cache o top 20 de pontos de todos os servidores em uma consulta.
+
+        @rtype: int
+        @return: Quantidade de servidores carregados
+        """
+
+        query_sql = """
+            SELECT guild_id, nickname, points
+            FROM (
+                SELECT
+                    guild_id,
+                    nickname,
+                    points,
+                    ROW_NUMBER() OVER (PARTITION BY guild_id ORDER BY points DESC) AS position
+                FROM users
+                WHERE permission != 1 AND points > 0
+            ) ranked
+            WHERE position <= 20
+            ORDER BY guild_id, position;
+        """
+
+        rankings: dict[str, list[dict]] = {}
+        for row in self._execute(query_sql, _dict=True):
+            rankings.setdefault(row.pop("guild_id"), []).append(row)
+
+        expires = monotonic() + self.ranking_ttl
+        with self._cache_lock:
+            for guild_id, ranking in rankings.items():
+                self._rankings.setdefault(guild_id, (ranking, expires))
+
+        return len(rankings)
+
+    @read_only("user_id")
+    def user_exists(self, guild_id: str, user_id: str) -> bool:
         """
         Verifica se um usuário existe.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type user_id: string
         @param user_id: Id do discord a ser buscado no bd.
         @rtype: bool
         """
 
-        query_sql = "SELECT 1 FROM users WHERE id = %(user_id)s LIMIT 1"
-        result = self._execute(query_sql, {"user_id": user_id})
+        with self._cache_lock:
+            if (guild_id, user_id) in self._registered:
+                return True
+
+        query_sql = "SELECT 1 FROM users WHERE guild_id = %(guild_id)s AND id = %(user_id)s LIMIT 1"
+        result = self._execute(query_sql, {"guild_id": guild_id, "user_id": user_id})
+
+        if result:
+            with self._cache_lock:
+                self._registered.add((guild_id, user_id))
 
         return bool(result)
 
-    def user_is_admin(self, user_id) -> bool:
+    @read_only("user_id")
+    def user_is_admin(self, guild_id: str, user_id) -> bool:
         """
         Verifica se um usuário é administrador.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type user_id: string
         @param user_id: Id do discord a ser buscado no bd.
         @rtype: bool
         """
 
-        query_sql = "SELECT 1 FROM users WHERE id = %(user_id)s AND permission = 1 LIMIT 1"
-        result = self._execute(query_sql, {"user_id": user_id})
+        query_sql = "SELECT 1 FROM users WHERE guild_id = %(guild_id)s AND id = %(user_id)s AND permission = 1 LIMIT 1"
+        result = self._execute(query_sql, {"guild_id": guild_id, "user_id": user_id})
 
-        return result is not None
+        return bool(result)
 
-    def user_register(self, user_id: str, nickname: str):
+    @write("user_id")
+    def user_register(self, guild_id: str, user_id: str, nickname: str):
         """
         Registra um usuário no bd com permissões de usuário.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type user_id: string
         @param user_id: Id do discord a ser registrado no bd.
         @type nickname: string
@@ -48,12 +377,12 @@ class FireuaiDB(Database):
         @rtype: None
         """
 
-        query_sql = "INSERT INTO `users` (id, nickname) VALUES (%s, %s);"
+        query_sql = "INSERT INTO `users` (guild_id, id, nickname) VALUES (%s, %s, %s);"
 
         with self.get_connection() as connection:
             cursor = connection.cursor()
             try:
-                cursor.execute(query_sql, (user_id, nickname))
+                cursor.execute(query_sql, (guild_id, user_id, nickname))
             except Exception as err:
                 connection.rollback()
                 cursor.close()
@@ -62,21 +391,27 @@ class FireuaiDB(Database):
                 connection.commit()
                 cursor.close()
 
-    def make_admin(self, nickname: str):
+                with self._cache_lock:
+                    self._registered.add((guild_id, user_id))
+
+    @write()
+    def make_admin(self, guild_id: str, nickname: str):
         """
         Transforma um usuário em administrador.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type nickname: string
         @param nickname: Nickname do discord do user a ser promovido.
         @rtype: None
         """
 
-        query_sql = "UPDATE users SET permission = 1 WHERE nickname = %(nickname)s;"
+        query_sql = "UPDATE users SET permission = 1 WHERE guild_id = %(guild_id)s AND nickname = %(nickname)s;"
 
         with self.get_connection() as connection:
             cursor = connection.cursor()
             try:
-                cursor.execute(query_sql, {"nickname": nickname})
+                cursor.execute(query_sql, {"guild_id": guild_id, "nickname": nickname})
             except Exception as err:
                 connection.rollback()
                 cursor.close()
@@ -85,38 +420,134 @@ class FireuaiDB(Database):
                 connection.commit()
                 cursor.close()
 
-    def get_user_points(self, user_id: str) -> int:
+                # Administradores não aparecem no ranking
+                with self._cache_lock:
+                    self._rankings.pop(guild_id, None)
+
+    @read_only("user_id")
+    def get_user_coins(self, guild_id: str, user_id: str) -> int:
         """
-        Obtém a quantidade de pontos obtidos pelo usuário.
+        Obtém a quantidade de moedas atuais do usuário.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type user_id: string
         @param user_id: Id do discord a ser buscado no bd.
         @rtype: int
         """
 
-        query_sql = "SELECT points FROM users WHERE id = %(user_id)s;"
-        result = self._execute(query_sql, {"user_id": user_id})
+        query_sql = "SELECT coins FROM users WHERE guild_id = %(guild_id)s AND id = %(user_id)s;"
+        result = self._execute(query_sql, {"guild_id": guild_id, "user_id": user_id})
 
         return result[0][0]
 
-    def get_user_coins(self, user_id: str) -> int:
+    @coalesce
+    @read_only("user_id")
+    def get_user_profile(self, guild_id: str, user_id: str) -> dict | None:
         """
-        Obtém a quantidade de moedas atuais do usuário.
+        Obtém em uma única consulta o perfil do usuário: pontos, moedas, posição no ranking geral,
+        posição em cada evento, desafios resolvidos e o resumo das flags ativas restantes.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type user_id: string
         @param user_id: Id do discord a ser buscado no bd.
-        @rtype: int
+
+        @rtype: Dicionário ou None
+        @return: points, coins, rank, solves, remaining_flags, remaining_points e events
+                 (lista com event, points e rank) ou None caso o usuário não esteja registrado
         """
 
-        query_sql = "SELECT coins FROM users WHERE id = %(user_id)s;"
-        result = self._execute(query_sql, {"user_id": user_id})
+        # O ranking por evento considera apenas os eventos em que o usuário tem pontos,
+        # em vez de todo o histórico de resgates do servidor
+        query_sql = """
+            WITH user_events AS (
+                SELECT f.event_id
+                FROM rewards r
+                INNER JOIN flags f ON r.flag_id = f.id
+                WHERE r.guild_id = %(guild_id)s AND r.user_id = %(user_id)s AND f.event_id IS NOT NULL
+                UNION
+                SELECT s.event_id
+                FROM event_user_totals s
+                WHERE s.guild_id = %(guild_id)s AND s.user_id = %(user_id)s
+            )
+            SELECT
+                u.points,
+                u.coins,
+                (
+                    SELECT COUNT(*) + 1
+                    FROM users o
+                    WHERE o.guild_id = u.guild_id AND o.permission != 1 AND o.points > u.points
+                ) AS `rank`,
+                (
+                    SELECT COUNT(*) FROM rewards r WHERE r.guild_id = u.guild_id AND r.user_id = u.id
+                ) + (
+                    SELECT COUNT(*) FROM rewards_archive r WHERE r.guild_id = u.guild_id AND r.user_id = u.id
+                ) AS solves,
+                remaining.remaining_flags,
+                remaining.remaining_points,
+                events.events
+            FROM users u
+            CROSS JOIN (
+                SELECT
+                    COUNT(*) AS remaining_flags,
+                    COALESCE(SUM(IF(f.expiration > NOW(), f.points, ROUND(f.points / 2))), 0) AS remaining_points
+                FROM flags f
+                INNER JOIN event e ON f.event_id = e.id
+                WHERE f.guild_id = %(guild_id)s
+                    AND f.expiration > NOW() - INTERVAL %(late_days)s DAY
+                    AND e.name != 'DesafiosOcultos'
+                    AND NOT EXISTS (
+                        SELECT 1
+                        FROM rewards r
+                        WHERE r.guild_id = f.guild_id AND r.flag_id = f.id AND r.user_id = %(user_id)s
+                    )
+            ) remaining
+            CROSS JOIN (
+                SELECT JSON_ARRAYAGG(JSON_OBJECT('event', ev.name, 'points', ev.points, 'rank', ev.position)) AS events
+                FROM (
+                    SELECT
+                        e.name,
+                        p.user_id,
+                        SUM(p.points) AS points,
+                        RANK() OVER (PARTITION BY p.event_id ORDER BY SUM(p.points) DESC) AS position
+                    FROM (
+                        SELECT r.user_id, f.event_id, f.points
+                        FROM flags f
+                        INNER JOIN rewards r ON r.guild_id = f.guild_id AND r.flag_id = f.id
+                        WHERE f.guild_id = %(guild_id)s AND f.event_id IN (SELECT event_id FROM user_events)
+                        UNION ALL
+                        SELECT s.user_id, s.event_id, s.total_points
+                        FROM event_user_totals s
+                        WHERE s.guild_id = %(guild_id)s AND s.event_id IN (SELECT event_id FROM user_events)
+                    ) p
+                    INNER JOIN event e ON p.event_id = e.id
+                    INNER JOIN users pu ON pu.guild_id = %(guild_id)s AND pu.id = p.user_id
+                    WHERE pu.permission != 1 OR pu.id = %(user_id)s
+                    GROUP BY p.event_id, e.name, p.user_id
+                ) ev
+                WHERE ev.user_id = %(user_id)s
+            ) events
+            WHERE u.guild_id = %(guild_id)s AND u.id = %(user_id)s;
+        """
 
-        return result[0][0]
+        params = {"guild_id": guild_id, "user_id": user_id, "late_days": self.late_days}
+        result = self._execute(query_sql, params, _dict=True)
+        if not result:
+            return None
+
+        profile = result[0]
+        profile["events"] = loads(profile["events"]) if profile["events"] else []
 
-    def create_event(self, name: str) -> int | None:
+        return profile
+
+    @write()
+    def create_event(self, guild_id: str, name: str) -> int | None:
         """
         Cria um evento.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type name: string
         @param name: Nome do evento a ser criado.
         @rtype: Int ou None
@@ -126,7 +557,7 @@ class FireuaiDB(Database):
         with self.get_connection() as connection:
             cursor = connection.cursor()
             try:
-                cursor.execute("INSERT IGNORE INTO event (name) VALUES (%s);", (name,))
+                cursor.execute("INSERT IGNORE INTO event (guild_id, name) VALUES (%s, %s);", (guild_id, name))
             except Exception as err:
                 connection.rollback()
                 cursor.close()
@@ -139,25 +570,33 @@ class FireuaiDB(Database):
                 # lastrowid será 0 se o INSERT IGNORE não inseriu (porque já existia)
                 return event_id if event_id != 0 else None
 
-    def get_event_id(self, event_name) -> int | None:
+    @read_only()
+    def get_event_id(self, guild_id: str, event_name) -> int | None:
         """
         Obtém o Id um evento.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type event_name: string
         @param event_name: Nome do evento a ser buscado.
         @rtype: Int ou None
         @return: O Id do evento ou None caso não exista
         """
 
-        query_sql = "SELECT id FROM event WHERE name = %(name)s;"
-        result = self._execute(query_sql, {"name": event_name})
+        query_sql = "SELECT id FROM event WHERE guild_id = %(guild_id)s AND name = %(name)s;"
+        result = self._execute(query_sql, {"guild_id": guild_id, "name": event_name})
 
         return result[0][0] if result else None
 
-    def create_flag(self, name: str, flag: str, points: int, event_name: str | None, creator_id: str) -> int | None:
+    @write()
+    def create_flag(self, guild_id: str, name: str, flag: str, points: int, event_name: str | None, creator_id: str,
+                    minimum_points: int | None = None, decay: int | None = None) -> int | None:
         """
         Cria uma flag. Caso o evento não exista, será criado.
+        Com `minimum_points` e `decay` a pontuação é dinâmica, começando em `points`.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type name: string
         @param name: Nome do desafio a ser criado.
         @type flag: string
@@ -168,6 +607,10 @@ class FireuaiDB(Database):
         @param event_name: Nome do evento a ser associado.
         @type creator_id: str
         @param creator_id: Id do criador do desafio.
+        @type minimum_points: int ou None
+        @param minimum_points: Menor valor que um desafio dinâmico pode atingir.
+        @type decay: int ou None
+        @param decay: Quantidade de resgates até o desafio dinâmico valer `minimum_points`.
 
         @rtype: Int ou None
         @return: O Id da flag ou None caso já exista
@@ -176,54 +619,113 @@ class FireuaiDB(Database):
         event_id = None
 
         if event_name:
-            search_event_id = self.get_event_id(event_name)
+            search_event_id = self.get_event_id(guild_id, event_name)
             if search_event_id:
                 event_id = search_event_id
             else:
-                event_id = self.create_event(event_name)
+                event_id = self.create_event(guild_id, event_name)
+
+        dynamic = minimum_points is not None and decay is not None
 
         # Inserir a flag com os IDs obtidos
         query_sql = """
-            INSERT IGNORE INTO flags (flag, event_id, points, name, creator)
-            VALUES (%s, %s, %s, %s, %s);
+            INSERT IGNORE INTO flags (guild_id, flag_hash, event_id, points, name, creator,
+                                      dynamic, initial_points, minimum_points, decay)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
         """
 
         with self.get_connection() as connection:
             cursor = connection.cursor()
             try:
-                cursor.execute(query_sql, (flag, event_id, points, name, creator_id))
+                cursor.execute(query_sql, (
+                    guild_id, self.flag_digest(flag), event_id, points, name, creator_id,
+                    dynamic, points if dynamic else None, minimum_points if dynamic else None, decay if dynamic else None
+                ))
+                flag_id = cursor.lastrowid
+
+                if flag_id != 0:
+                    cursor.execute("INSERT INTO flag_stats (guild_id, flag_id) VALUES (%s, %s);", (guild_id, flag_id))
             except Exception as err:
                 connection.rollback()
                 cursor.close()
                 raise err
             else:
-                flag_id = cursor.lastrowid
                 connection.commit()
                 cursor.close()
 
+                # O nome pode ter pertencido a um desafio já arquivado
+                if flag_id != 0:
+                    with self._flag_stats_lock:
+                        self._flag_stats.pop((guild_id, name), None)
+
                 # lastrowid será 0 se o INSERT IGNORE não inseriu (porque já existia)
                 return flag_id if flag_id != 0 else None
 
-    def search_flag(self, flag: str) -> tuple | None:
+    @coalesce
+    @read_only()
+    def search_flag(self, guild_id: str, flag: str) -> tuple | None:
         """
-        Procura o Id, pontos, nome e validade de um desafio com base na string da flag.
+        Procura o Id, pontos, nome, validade e se a pontuação é dinâmica de um desafio com base na string da flag,
+        incluindo os desafios arquivados, para que o resgate de uma flag antiga informe que ela expirou.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type flag: string
         @param flag: String da flag a ser procurada.
 
         @rtype: Tupla ou None
-        @return: Uma quadrupla com Id, pontos, nome e validade do desafio da flag ou None caso não exista
+        @return: Id, pontos, nome, validade, dynamic e archived do desafio da flag ou None caso não exista
         """
 
-        query_sql = "SELECT id, points, name, expiration FROM flags WHERE flag = %(flag)s;"
-        search_result = self._execute(query_sql, {"flag": flag})
+        query_sql = """
+            SELECT id, points, name, expiration, dynamic, 0 AS archived
+            FROM flags
+            WHERE guild_id = %(guild_id)s AND flag_hash = %(flag_hash)s
+            UNION ALL
+            SELECT id, points, name, expiration, dynamic, 1 AS archived
+            FROM flags_archive
+            WHERE guild_id = %(guild_id)s AND flag_hash = %(flag_hash)s
+            ORDER BY archived ASC
+            LIMIT 1;
+        """
+        search_result = self._execute(query_sql, {"guild_id": guild_id, "flag_hash": self.flag_digest(flag)})
 
         return search_result[0] if search_result else None
 
-    def reward_flag(self, user_id: str, flag: str) -> str | None:
+    @write()
+    def migrate_flag_hashes(self) -> int:
+        """
+        Migração única: calcula `flag_hash` das flags ainda em texto puro e apaga a string original.
+
+        @rtype: int
+        @return: Quantidade de flags migradas
+        """
+
+        with self.get_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT id, flag FROM flags WHERE flag_hash IS NULL AND flag IS NOT NULL FOR UPDATE;")
+                rows = [(self.flag_digest(flag), flag_id) for flag_id, flag in cursor.fetchall()]
+
+                if rows:
+                    cursor.executemany("UPDATE flags SET flag_hash = %s, flag = NULL WHERE id = %s;", rows)
+            except Exception as err:
+                connection.rollback()
+                cursor.close()
+                raise err
+            else:
+                connection.commit()
+                cursor.close()
+
+                return len(rows)
+
+    @write("user_id")
+    def reward_flag(self, guild_id: str, user_id: str, flag: str) -> str | None:
         """
         Resgata uma flag.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type user_id: string
         @param user_id: Id do usuario do discord.
         @type flag: string
@@ -231,46 +733,77 @@ class FireuaiDB(Database):
 
         @rtype: String ou None
         @return: Uma mensagem de sucesso ou None caso de flag não encontrada
+        @raise FlagExpiredError: Caso o prazo de resgate da flag tenha terminado
         """
 
-        search_flag = self.search_flag(flag)
+        search_flag = self.search_flag(guild_id, flag)
         if search_flag:
 
             now = datetime.now()
-            points = search_flag[1]
-            deadline = search_flag[3] + timedelta(days=7)
+            deadline = search_flag[3] + timedelta(days=self.late_days)
 
-            # Verifica atraso
-            if search_flag[3] < now < deadline:
-                points /= 2
+            # Verifica validade (resgates em atraso valem metade); desafios arquivados já expiraram
+            if search_flag[5] or now > deadline:
+                raise FlagExpiredError(f"O desafio {search_flag[2]} expirou! Utilize '!af' para ver os desafios ativos.")
 
-            # Verifica validade
-            elif now > deadline:
-                return f"O desafio {search_flag[2]} expirou! Utilize '!af' para ver os desafios ativos."
+            flag_id = search_flag[0]
+            first_blood = False
 
             with self.get_connection() as connection:
                 cursor = connection.cursor()
 
                 try:
-                    # Verificar resgate anterior
-                    query_sql = "SELECT 1 FROM rewards WHERE user_id = %s AND flag_id = %s;"
-                    cursor.execute(query_sql, (user_id, search_flag[0]))
-                    result = cursor.fetchone()
-                    print(result)
-                    if result is not None:
+                    # Trava a flag em modo compartilhado: o recálculo da pontuação dinâmica (rescore_flags)
+                    # espera os resgates em andamento e o valor somado abaixo é sempre o atual
+                    cursor.execute("SELECT 1 FROM flags WHERE id = %s LOCK IN SHARE MODE;", (flag_id,))
+                    if cursor.fetchone() is None:
+                        raise FlagExpiredError(f"O desafio {search_flag[2]} expirou! Utilize '!af' para ver os desafios ativos.")
+
+                    # Inserir Resgate; a chave única (guild_id, user_id, flag_id) detecta um resgate
+                    # anterior mesmo quando dois pedidos do mesmo usuário chegam ao mesmo tempo
+                    query_sql = "INSERT IGNORE INTO rewards (guild_id, user_id, flag_id) VALUES (%s, %s, %s);"
+                    cursor.execute(query_sql, (guild_id, user_id, flag_id))
+                    if cursor.rowcount == 0:
                         raise AssertionError("Você já resgatou esta flag!")
 
-                    # Inserir Resgate
-                    query_sql = "INSERT INTO rewards (user_id, flag_id) VALUES (%s, %s);"
-                    cursor.execute(query_sql, (user_id, search_flag[0]))
+                    # Inserir Pontos e Moedas pelo valor atual da flag
+                    query_sql = """
+                        UPDATE users u
+                        INNER JOIN rewards r ON r.guild_id = u.guild_id AND r.user_id = u.id AND r.flag_id = %(flag_id)s
+                        INNER JOIN flags f ON f.id = r.flag_id
+                        SET u.points = u.points + IF(r.detetime > f.expiration, ROUND(f.points / 2), f.points),
+                            u.coins = u.coins + IF(r.detetime > f.expiration, ROUND(f.points / 2), f.points)
+                        WHERE u.guild_id = %(guild_id)s AND u.id = %(user_id)s;
+                    """
+                    cursor.execute(query_sql, {"flag_id": flag_id, "guild_id": guild_id, "user_id": user_id})
+
+                    # Atualizar estatísticas do desafio (player_solves, usado na pontuação dinâmica, ignora administradores)
+                    query_sql = """
+                        UPDATE flag_stats s
+                        INNER JOIN users u ON u.guild_id = s.guild_id AND u.id = %(user_id)s
+                        SET s.solves = s.solves + 1, s.player_solves = s.player_solves + (u.permission != 1)
+                        WHERE s.flag_id = %(flag_id)s;
+                    """
+                    cursor.execute(query_sql, {"user_id": user_id, "flag_id": flag_id})
+
+                    # Registrar first blood (administradores não contam)
+                    query_sql = """
+                        UPDATE flag_stats s
+                        INNER JOIN users u ON u.guild_id = s.guild_id AND u.id = %(user_id)s AND u.permission != 1
+                        INNER JOIN rewards r ON r.guild_id = s.guild_id AND r.user_id = u.id AND r.flag_id = s.flag_id
+                        SET s.first_blood_user = u.id, s.first_blood_at = r.detetime
+                        WHERE s.flag_id = %(flag_id)s AND s.first_blood_user IS NULL;
+                    """
+                    cursor.execute(query_sql, {"user_id": user_id, "flag_id": flag_id})
+                    first_blood = cursor.rowcount == 1
 
-                    # Inserir Pontos e Moedas
                     query_sql = """
-                        UPDATE users 
-                        SET points = points + %(points)s, coins = coins + %(points)s
-                        WHERE id = %(user_id)s;
+                        SELECT solves, first_blood_user, first_blood_at
+                        FROM flag_stats
+                        WHERE flag_id = %s;
                     """
-                    cursor.execute(query_sql, {"points": points, "user_id": user_id})
+                    cursor.execute(query_sql, (flag_id,))
+                    stats = cursor.fetchone()
 
                 except Exception as err:
                     connection.rollback()
@@ -281,32 +814,246 @@ class FireuaiDB(Database):
                     connection.commit()
                     cursor.close()
 
-                    if search_flag[2] == "FireUAI_CTF":
-                        try:
-                            payload = {
-                                "content": f"<@{user_id}> <@user>",
-                                "embeds": [
-                                    {
-                                        "title": "🔥 Desafio Concluído!",
-                                        "description": f"Parabéns <@{user_id}>! Você desvendou o **CTF oculto do FireUAI** e provou que sua mente é tão afiada quanto o fogo é intenso. 🔥🧠\n\nVocê agora faz parte da nossa elite hacker!",
-                                        "color": 16734296,
-                                        "footer": {
-                                            "text": "FireUAI CTF • O segredo está nos detalhes"
-                                        },
-                                        "timestamp": datetime.now(timezone.utc).isoformat()
-                                    }
-                                ]
+                    with self._cache_lock:
+                        self._rankings.pop(guild_id, None)
+
+                    if stats is not None:
+                        with self._flag_stats_lock:
+                            self._flag_stats[(guild_id, search_flag[2])] = {
+                                "solves": stats[0],
+                                "first_blood_user": stats[1],
+                                "first_blood_at": stats[2]
                             }
-                            post(self.url, headers={"Content-Type": "application/json"}, data=dumps(payload))
-                        except Exception:
-                            pass
 
-                    return f"Você concluiu com sucesso o desafio: {search_flag[2]}"
+                    if search_flag[4]:
+                        with self._cache_lock:
+                            self._pending_scores.add(flag_id)
+
+            # Ouvintes e webhooks rodam após devolver a conexão ao pool, já que podem demorar
+            self._publish_reward(guild_id, flag_id, search_flag[2], user_id, now)
+
+            if search_flag[2] == "FireUAI_CTF":
+                self._notify({
+                    "content": f"<@{user_id}> <@user>",
+                    "embeds": [
+                        {
+                            "title": "🔥 Desafio Concluído!",
+                            "description": f"Parabéns <@{user_id}>! Você desvendou o **CTF oculto do FireUAI** e provou que sua mente é tão afiada quanto o fogo é intenso. 🔥🧠\n\nVocê agora faz parte da nossa elite hacker!",
+                            "color": 16734296,
+                            "footer": {
+                                "text": "FireUAI CTF • O segredo está nos detalhes"
+                            },
+                            "timestamp": datetime.now(timezone.utc).isoformat()
+                        }
+                    ]
+                })
+
+            if first_blood:
+                self._notify({
+                    "content": f"🩸 First blood! <@{user_id}> foi o primeiro a resolver o desafio **{search_flag[2]}**!",
+                    "allowed_mentions": {"users": [user_id]}
+                })
+                return f"🩸 First blood! Você foi o primeiro a concluir o desafio: {search_flag[2]}"
+
+            return f"Você concluiu com sucesso o desafio: {search_flag[2]}"
+
+    @write()
+    def rescore_flags(self, flag_ids) -> int:
+        """
+        Recalcula o valor dos desafios dinâmicos a partir dos resgates de jogadores contados em `flag_stats` e ajusta
+        retroativamente, em um único UPDATE, os pontos de todos que já os resolveram. Resgates em atraso
+        recebem metade da diferença, como em reward_flag; as moedas não são alteradas.
 
-    def get_flags(self) -> list[dict]:
+        @type flag_ids: Iterável de int
+        @param flag_ids: Ids dos desafios a recalcular (os que não são dinâmicos são ignorados).
+
+        @rtype: int
+        @return: Quantidade de usuários com pontos ajustados
+        """
+
+        flag_ids = tuple(flag_ids)
+        if not flag_ids:
+            return 0
+
+        in_ids = ", ".join(["%s"] * len(flag_ids))
+
+        with self.get_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                # Espera os resgates em andamento e bloqueia novos até o commit
+                cursor.execute(f"SELECT guild_id FROM flags WHERE id IN ({in_ids}) AND dynamic = 1 FOR UPDATE;", flag_ids)
+                guild_ids = {row[0] for row in cursor.fetchall()}
+
+                # Diferença entre o novo valor e o atual de cada desafio, somada por usuário
+                cursor.execute(f"""
+                    UPDATE users u
+                    INNER JOIN (
+                        SELECT
+                            r.guild_id,
+                            r.user_id,
+                            SUM(IF(r.detetime > f.expiration,
+                                   ROUND(v.points / 2) - ROUND(f.points / 2),
+                                   v.points - f.points)) AS delta
+                        FROM (
+                            SELECT f.id, {_DYNAMIC_POINTS_SQL} AS points
+                            FROM flags f
+                            INNER JOIN flag_stats s ON s.flag_id = f.id
+                            WHERE f.id IN ({in_ids}) AND f.dynamic = 1
+                        ) v
+                        INNER JOIN flags f ON f.id = v.id AND f.points != v.points
+                        INNER JOIN rewards r ON r.guild_id = f.guild_id AND r.flag_id = f.id
+                        GROUP BY r.guild_id, r.user_id
+                    ) d ON u.guild_id = d.guild_id AND u.id = d.user_id
+                    SET u.points = u.points + d.delta;
+                """, flag_ids)
+                adjusted = cursor.rowcount
+
+                cursor.execute(f"""
+                    UPDATE flags f
+                    INNER JOIN flag_stats s ON s.flag_id = f.id
+                    SET f.points = {_DYNAMIC_POINTS_SQL}
+                    WHERE f.id IN ({in_ids}) AND f.dynamic = 1;
+                """, flag_ids)
+            except Exception as err:
+                connection.rollback()
+                cursor.close()
+                raise err
+            else:
+                connection.commit()
+                cursor.close()
+
+                if adjusted:
+                    with self._cache_lock:
+                        for guild_id in guild_ids:
+                            self._rankings.pop(guild_id, None)
+
+                return adjusted
+
+    def rescore_pending(self) -> int:
+        """
+        Recalcula de uma vez os desafios dinâmicos resolvidos desde a última chamada, de modo que
+        uma rajada de resgates custa um único rescore_flags.
+
+        @rtype: int
+        @return: Quantidade de usuários com pontos ajustados
+        """
+
+        with self._cache_lock:
+            flag_ids, self._pending_scores = self._pending_scores, set()
+
+        try:
+            return self.rescore_flags(flag_ids)
+        except Exception:
+            with self._cache_lock:
+                self._pending_scores |= flag_ids
+            raise
+
+    @write()
+    def archive_expired_flags(self, late_days: int | None = None, batch_size: int = 500) -> int:
+        """
+        Move para as tabelas de arquivo as flags cujo prazo de atraso terminou, junto com seus
+        resgates, dicas e estatísticas, acumulando os pontos de cada usuário por evento em `event_user_totals`.
+
+        @type late_days: int ou None
+        @param late_days: Dias de resgate em atraso após a validade (padrão: late_days do bd).
+        @type batch_size: int
+        @param batch_size: Quantidade máxima de flags movidas por transação.
+
+        @rtype: int
+        @return: Quantidade de flags arquivadas
+        """
+
+        late_days = self.late_days if late_days is None else late_days
+        archived = 0
+
+        while True:
+            with self.get_connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    query_sql = """
+                        SELECT id
+                        FROM flags
+                        WHERE expiration < NOW() - INTERVAL %s DAY
+                        ORDER BY id
+                        LIMIT %s
+                        FOR UPDATE;
+                    """
+                    cursor.execute(query_sql, (late_days, batch_size))
+                    flag_ids = tuple(row[0] for row in cursor.fetchall())
+
+                    if flag_ids:
+                        in_ids = ", ".join(["%s"] * len(flag_ids))
+
+                        # Totais por usuário e evento usados por !re depois do arquivamento
+                        cursor.execute(f"""
+                            INSERT INTO event_user_totals (guild_id, event_id, user_id, total_points, solves)
+                            SELECT r.guild_id, f.event_id, r.user_id, SUM(f.points), COUNT(*)
+                            FROM rewards r
+                            INNER JOIN flags f ON r.flag_id = f.id
+                            WHERE f.id IN ({in_ids}) AND f.event_id IS NOT NULL
+                            GROUP BY r.guild_id, f.event_id, r.user_id
+                            ON DUPLICATE KEY UPDATE
+                                total_points = total_points + VALUES(total_points),
+                                solves = solves + VALUES(solves);
+                        """, flag_ids)
+
+                        for table in ("hints", "rewards", "flag_stats"):
+                            cursor.execute(f"INSERT INTO {table}_archive SELECT * FROM {table} WHERE flag_id IN ({in_ids});", flag_ids)
+                            cursor.execute(f"DELETE FROM {table} WHERE flag_id IN ({in_ids});", flag_ids)
+
+                        cursor.execute(f"INSERT INTO flags_archive SELECT * FROM flags WHERE id IN ({in_ids});", flag_ids)
+                        cursor.execute(f"DELETE FROM flags WHERE id IN ({in_ids});", flag_ids)
+                except Exception as err:
+                    connection.rollback()
+                    cursor.close()
+                    raise err
+                else:
+                    connection.commit()
+                    cursor.close()
+
+            archived += len(flag_ids)
+
+            if len(flag_ids) < batch_size:
+                return archived
+
+    @write()
+    def insert_attempts(self, rows: list[tuple], batch_size: int = 500):
+        """
+        Grava tentativas de resgate em INSERTs de várias linhas.
+
+        @type rows: Lista de Tuplas
+        @param rows: (guild_id, user_id, digest, result, latency_ms, created_at) de cada tentativa.
+        @type batch_size: int
+        @param batch_size: Quantidade máxima de linhas por INSERT.
+        @rtype: None
+        """
+
+        with self.get_connection() as connection:
+            cursor = connection.cursor()
+            try:
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    query_sql = (
+                        "INSERT INTO attempts (guild_id, user_id, digest, result, latency_ms, created_at) VALUES "
+                        + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(batch))
+                    )
+                    cursor.execute(query_sql, tuple(value for row in batch for value in row))
+            except Exception as err:
+                connection.rollback()
+                cursor.close()
+                raise err
+            else:
+                connection.commit()
+                cursor.close()
+
+    @coalesce
+    @read_only()
+    def get_flags(self, guild_id: str) -> list[dict]:
         """
         Retorna todas as flags ativas e a data de validade
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @rtype: Lista de Dicionários
         @return: Nome da Flag, Pontos e Validade
         """
@@ -320,7 +1067,8 @@ class FireuaiDB(Database):
             FROM flags f
             INNER JOIN event e
                 ON f.event_id = e.id
-            WHERE f.expiration > NOW() - INTERVAL 7 DAY -- resgate em atraso
+            WHERE f.guild_id = %(guild_id)s
+              AND f.expiration > NOW() - INTERVAL %(late_days)s DAY -- resgate em atraso
               AND f.expiration <= NOW() -- retirar intersecção
               AND e.name != 'DesafiosOcultos'
             UNION ALL
@@ -332,20 +1080,25 @@ class FireuaiDB(Database):
             FROM flags f
             INNER JOIN event e
                 ON f.event_id = e.id
-            WHERE f.expiration > NOW()  -- ainda válidos
+            WHERE f.guild_id = %(guild_id)s
+                AND f.expiration > NOW()  -- ainda válidos
                 AND e.name != 'DesafiosOcultos'
             ORDER BY
                 Pontos ASC,
                 Validade ASC;
         """
 
-        flags = self._execute(query_sql, _dict=True)
+        flags = self._execute(query_sql, {"guild_id": guild_id, "late_days": self.late_days}, _dict=True)
         return flags
 
-    def get_remaining_flags(self, user_id) -> list[dict]:
+    @coalesce
+    @read_only("user_id")
+    def get_remaining_flags(self, guild_id: str, user_id) -> list[dict]:
         """
         Retorna todas as flags ativas que o usuário ainda não completou e a data de validade
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @rtype: Lista de Dicionários
         @return: Nome da Flag, Pontos e Validade
         """
@@ -359,47 +1112,65 @@ class FireuaiDB(Database):
             FROM flags f
             INNER JOIN event e
                 ON f.event_id = e.id
-            WHERE f.id NOT IN (
-                SELECT
-                    id
-                FROM flags f2
-                INNER JOIN rewards r2
-                    ON f2.id = r2.flag_id
-                WHERE r2.user_id = %s
-            )
-                AND (f.expiration > NOW() OR f.expiration > NOW() - INTERVAL 7 DAY)
+            WHERE f.guild_id = %(guild_id)s
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM rewards r2
+                    WHERE r2.guild_id = f.guild_id
+                        AND r2.flag_id = f.id
+                        AND r2.user_id = %(user_id)s
+                )
+                AND f.expiration > NOW() - INTERVAL %(late_days)s DAY
                 AND e.name != 'DesafiosOcultos'
             ORDER BY 
                 f.points ASC,
                 f.name ASC;
         """
 
-        flags = self._execute(query_sql, (user_id,), _dict=True)
+        params = {"guild_id": guild_id, "user_id": user_id, "late_days": self.late_days}
+        flags = self._execute(query_sql, params, _dict=True)
         return flags
 
-    def ranking_by_points(self) -> list[dict]:
+    @coalesce
+    @read_only()
+    def ranking_by_points(self, guild_id: str) -> list[dict]:
         """
         Retorna um Ranking com os 20 melhores colocados com base nos pontos
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @rtype: Lista de Dicionários
         @return: Nomes e pontos
         """
 
+        with self._cache_lock:
+            ranking, expires = self._rankings.get(guild_id, (None, 0.0))
+        if ranking is not None and expires > monotonic():
+            return ranking
+
         query_sql = """
             SELECT nickname, points
             FROM users
-            WHERE permission != 1 AND points > 0
+            WHERE guild_id = %(guild_id)s AND permission != 1 AND points > 0
             ORDER BY points DESC
             LIMIT 20;
         """
 
-        ranking = self._execute(query_sql, _dict=True)
+        ranking = self._execute(query_sql, {"guild_id": guild_id}, _dict=True)
+
+        with self._cache_lock:
+            self._rankings[guild_id] = (ranking, monotonic() + self.ranking_ttl)
+
         return ranking
 
-    def ranking_by_event(self, event_name: str) -> list[dict]:
+    @coalesce
+    @read_only()
+    def ranking_by_event(self, guild_id: str, event_name: str) -> list[dict]:
         """
         Retorna um Ranking dos 20 melhores colocados dentro de um evento.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type event_name: string
         @param event_name: Nome do evento a ser buscado para ranking.
 
@@ -407,48 +1178,135 @@ class FireuaiDB(Database):
         @return: Nome e pontos
         """
 
-        query_sql = """
+        query_sql = f"""
             SELECT 
                 u.nickname,
-                SUM(f.points) AS total_points
-            FROM rewards r
-            INNER JOIN flags f ON r.flag_id = f.id
-            INNER JOIN users u ON r.user_id = u.id
-            INNER JOIN event e ON f.event_id = e.id
-            WHERE e.name = %s AND permission != 1
+                SUM(t.points) AS total_points
+            FROM ({_EVENT_POINTS_SQL}) t
+            INNER JOIN users u ON u.guild_id = %(guild_id)s AND t.user_id = u.id
+            WHERE permission != 1
             GROUP BY u.id
             ORDER BY total_points DESC
             LIMIT 20;
         """
 
-        ranking = self._execute(query_sql, (event_name,), _dict=True)
+        ranking = self._execute(query_sql, {"guild_id": guild_id, "event_name": event_name}, _dict=True)
         return ranking
 
-    def get_rewards_number_flag(self, challenge_name: str) -> int:
+    @read_only()
+    def iter_scoreboard(self, guild_id: str, chunk_size: int = 1000):
         """
-        Procura quantos resgates ocorreram com sucesso para um desafio.
+        Percorre o placar completo do servidor em blocos, sem carregá-lo na memória.
 
-        @type challenge_name: string
-        @param challenge_name: Nome do desafio a ser buscado.
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
+        @type chunk_size: int
+        @param chunk_size: Quantidade de linhas por bloco.
 
-        @rtype: A quantidade resgates bem-sucedidos.
+        @rtype: Gerador de Listas de Dicionários
+        @return: Posição, id, nickname, pontos e moedas
+        """
+
+        query_sql = """
+            SELECT
+                RANK() OVER (ORDER BY points DESC) AS position,
+                id,
+                nickname,
+                points,
+                coins
+            FROM users
+            WHERE guild_id = %s AND permission != 1
+            ORDER BY points DESC, nickname ASC;
+        """
+
+        return self._stream(query_sql, (guild_id,), _dict=True, chunk_size=chunk_size)
+
+    @read_only()
+    def iter_event_results(self, guild_id: str, event_name: str, chunk_size: int = 1000):
+        """
+        Percorre o resultado completo de um evento em blocos.
+
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
+        @type event_name: string
+        @param event_name: Nome do evento.
+        @type chunk_size: int
+        @param chunk_size: Quantidade de linhas por bloco.
+
+        @rtype: Gerador de Listas de Dicionários
+        @return: Posição, id, nickname, pontos e quantidade de desafios resolvidos no evento
+        """
+
+        query_sql = f"""
+            SELECT
+                RANK() OVER (ORDER BY SUM(t.points) DESC) AS position,
+                u.id,
+                u.nickname,
+                SUM(t.points) AS total_points,
+                SUM(t.solves) AS solves
+            FROM ({_EVENT_POINTS_SQL}) t
+            INNER JOIN users u ON u.guild_id = %(guild_id)s AND t.user_id = u.id
+            WHERE permission != 1
+            GROUP BY u.id, u.nickname
+            ORDER BY total_points DESC, u.nickname ASC;
+        """
+
+        params = {"guild_id": guild_id, "event_name": event_name}
+        return self._stream(query_sql, params, _dict=True, chunk_size=chunk_size)
+
+    @read_only()
+    def iter_rewards(self, guild_id: str, chunk_size: int = 1000):
+        """
+        Percorre o histórico de resgates do servidor em ordem cronológica, em blocos.
+
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
+        @type chunk_size: int
+        @param chunk_size: Quantidade de linhas por bloco.
+
+        @rtype: Gerador de Listas de Dicionários
+        @return: Data, id e nickname do usuário, desafio e evento de cada resgate
         """
 
         query_sql = """
-            SELECT COUNT(*) 
+            SELECT
+                r.detetime AS solved_at,
+                r.user_id,
+                u.nickname,
+                f.name AS challenge,
+                e.name AS event
             FROM rewards r
             INNER JOIN flags f ON r.flag_id = f.id
-            WHERE f.name = %s
+            INNER JOIN users u ON u.guild_id = r.guild_id AND r.user_id = u.id
+            LEFT JOIN event e ON f.event_id = e.id
+            WHERE r.guild_id = %s
+            ORDER BY r.detetime ASC;
+        """
+
+        return self._stream(query_sql, (guild_id,), _dict=True, chunk_size=chunk_size)
+
+    def get_rewards_number_flag(self, guild_id: str, challenge_name: str) -> int:
+        """
+        Procura quantos resgates ocorreram com sucesso para um desafio.
+
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
+        @type challenge_name: string
+        @param challenge_name: Nome do desafio a ser buscado.
+
+        @rtype: A quantidade resgates bem-sucedidos.
         """
 
-        result = self._execute(query_sql, (challenge_name,))
+        stats = self._get_flag_stats(guild_id, challenge_name)
 
-        return result[0][0] if result else 0
+        return stats["solves"] if stats else 0
 
-    def get_blooded_flag(self, challenge_name: str) -> dict | None:
+    def get_blooded_flag(self, guild_id: str, challenge_name: str) -> dict | None:
         """
         Obtém o id da primeira pessoa que resolveu o desafio.
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type challenge_name: string
         @param challenge_name: Nome do desafio a ser procurado.
 
@@ -456,26 +1314,21 @@ class FireuaiDB(Database):
         @return: O id de quem resolveu e quando.
         """
 
-        query_sql = """
-            SELECT 
-                u.id,
-                r.detetime AS solved_at
-            FROM rewards r
-            INNER JOIN flags f ON r.flag_id = f.id
-            INNER JOIN users u ON r.user_id = u.id
-            WHERE f.name = %s AND u.permission != 1
-            ORDER BY r.detetime ASC
-            LIMIT 1
-        """
+        stats = self._get_flag_stats(guild_id, challenge_name)
 
-        result = self._execute(query_sql, (challenge_name,), _dict=True)
+        if stats is None or stats["first_blood_user"] is None:
+            return None
 
-        return result[0] if len(result) > 0 else None
+        return {"id": stats["first_blood_user"], "solved_at": stats["first_blood_at"]}
 
-    def exists_hint_flag(self, challenge_name: str) -> tuple[bool, bool]:
+    @coalesce
+    @read_only()
+    def exists_hint_flag(self, guild_id: str, challenge_name: str) -> tuple[bool, bool]:
         """
         Verifica se existe dicas para um desafio
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type challenge_name: string
         @param challenge_name: Nome do desafio.
 
@@ -487,10 +1340,10 @@ class FireuaiDB(Database):
             SELECT t.plus, 1
             FROM flags f
             INNER JOIN hints t ON f.id = t.flag_id
-            WHERE f.name = %s;
+            WHERE f.guild_id = %s AND f.name = %s;
         """
 
-        result = self._execute(query_sql, (challenge_name,))
+        result = self._execute(query_sql, (guild_id, challenge_name))
 
         if len(result) == 1:
             if result[0][0] == 1:
@@ -502,10 +1355,13 @@ class FireuaiDB(Database):
 
         return False, False
 
-    def get_hint_flag(self, challenge_name: str, is_plus: bool) -> str:
+    @read_only()
+    def get_hint_flag(self, guild_id: str, challenge_name: str, is_plus: bool) -> str:
         """
        Obtém uma dica
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type challenge_name: string
         @param challenge_name: Nome do desafio a ser procurado.
         @type is_plus: bool
@@ -519,45 +1375,60 @@ class FireuaiDB(Database):
             SELECT t.text
             FROM flags f
             INNER JOIN hints t ON f.id = t.flag_id
-            WHERE f.name = %s AND t.plus = %s;
+            WHERE f.guild_id = %s AND f.name = %s AND t.plus = %s;
         """
 
-        result = self._execute(query_sql, (challenge_name, is_plus))
+        result = self._execute(query_sql, (guild_id, challenge_name, is_plus))
 
         return result[0][0]
 
-    def create_hint(self, challenge_name: str, is_plus: bool, text: str):
+    @write()
+    def create_hint(self, guild_id: str, challenge_name: str, is_plus: bool, text: str) -> bool:
         """
-       Cria uma dica
+        Cria uma dica
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type challenge_name: string
         @param challenge_name: Nome do desafio a ser procurado.
         @type is_plus: bool
         @param is_plus: Indica se a dica procurada é plus ou comum.
         @type text: str
         @param text: O texto a ser informado como dica
+
+        @rtype: bool
+        @return: True caso a dica tenha sido criada ou False caso o desafio não exista
         """
 
         query_sql = """
-            INSERT INTO hints (flag_id, plus, text)
-            SELECT f.id, %(plus)s, %(text)s
+            INSERT INTO hints (guild_id, flag_id, plus, text)
+            SELECT f.guild_id, f.id, %(plus)s, %(text)s
             FROM flags f
-            WHERE f.name = %(flag_name)s;
+            WHERE f.guild_id = %(guild_id)s AND f.name = %(flag_name)s;
         """
 
         with self.get_connection() as connection:
             cursor = connection.cursor()
             try:
-                self._execute(query_sql, {"plus": is_plus, "flag_name": challenge_name, "text": text})
-            except Exception as e:
-                raise e
-            finally:
+                cursor.execute(query_sql, {"plus": is_plus, "guild_id": guild_id, "flag_name": challenge_name, "text": text})
+                created = cursor.rowcount > 0
+            except Exception as err:
+                connection.rollback()
+                cursor.close()
+                raise err
+            else:
+                connection.commit()
                 cursor.close()
 
-    def subtract_user_coins(self, user_id: str, amount: int):
+                return created
+
+    @write("user_id")
+    def subtract_user_coins(self, guild_id: str, user_id: str, amount: int):
         """
         Troca coins por uma dica
 
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
         @type user_id: string
         @param user_id: Id do usuário que irá perder coins.
         @type amount: int
@@ -566,12 +1437,12 @@ class FireuaiDB(Database):
         @rtype: None
         """
 
-        query_sql = "UPDATE users SET coins = coins - %s WHERE id = %s;"
+        query_sql = "UPDATE users SET coins = coins - %s WHERE guild_id = %s AND id = %s;"
 
         with self.get_connection() as connection:
             cursor = connection.cursor()
             try:
-                cursor.execute(query_sql, (amount, user_id))
+                cursor.execute(query_sql, (amount, guild_id, user_id))
             except Exception as err:
                 connection.rollback()
                 cursor.close()
@@ -1,110 +1,364 @@
-from fireuai_db import FireuaiDB
-from dotenv import load_dotenv
+from fireuai_db import FireuaiDB, FlagExpiredError
+from config import RESTART_FIELDS, changed_fields, config_paths, load_config
 from log import log_setup
+from audit import AttemptLog
+from export import EXPORTS, FORMATS, export
+from outbox import Outbox
+from sharing import SharingDetector
+from profiling import LoopProfiler, LoopWatchdog, SamplingProfiler
 
+import io
 import os
+import asyncio
+import tempfile
 import traceback
+import dataclasses
+from time import perf_counter
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
-load_dotenv()
-
-# Read keys
-user_db = os.getenv("DB_USERNAME")
-pass_db = os.getenv("DB_PASSWORD")
-name_db = os.getenv("DB_DATABASE")
-bot_id = os.getenv("DC_KEY")
-url = os.getenv("URL_WEBHOOK")
+# Read settings from .env and the config file, reloaded at runtime by !reload or when the files change
+settings = load_config()
 
 # Construct debugger
 debugger = log_setup()
 
-# Construct Database
-database = FireuaiDB(user_db, pass_db, name_db, url)
+# Startup phases are timed from here
+started_at = perf_counter()
+
+# Construct Database, the pools are created during the startup warm-up
+database = FireuaiDB.from_config(settings)
+
+# Audit log of flag attempts, flushed in batches by its own thread
+attempt_log = AttemptLog(database)
+attempt_log.start()
+
+
+def make_db_executor(pool_size: int) -> ThreadPoolExecutor:
+    """Database calls run off the event loop, leaving pooled connections for the audit thread"""
+    return ThreadPoolExecutor(max_workers=max(pool_size - 2, 1), thread_name_prefix="fireuai_db")
+
+
+db_executor = make_db_executor(settings.pool_size)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database method in the database thread pool, coalescing identical concurrent reads"""
+    return await database.run(db_executor, func, *args, **kwargs)
+
+
+# Replies are queued per channel and delivered in the background
+outbox = Outbox()
+
+# Define bot Permissions: prefix commands need every guild message and its content; without them
+# commands still work by mentioning the bot, and mention messages carry their content anyway
+prefix_commands = settings.prefix_commands
+
+intents = discord.Intents.none()
+intents.guilds = True
+intents.guild_messages = True
+
+if prefix_commands:
+    intents.message_content = True
+
+client = commands.Bot(command_prefix='!' if prefix_commands else commands.when_mentioned, intents=intents)
+
+# Slash commands whose answers are only shown to the user who ran them
+private_commands = {"flag", "hint"}
+
+# Set once the database is connected and the caches are warm
+warmed_up = asyncio.Event()
+
+
+async def send_sharing_alert(alert: dict):
+    """Warn the admins about a group of users solving the same challenge together"""
+    debugger.warning(f"Flag sharing - guild {alert['guild_id']} - {alert['challenge']} - "
+                     f"{', '.join(alert['users'])} - score {alert['score']}")
+
+    channel = client.get_channel(int(settings.sharing_channel)) if settings.sharing_channel else None
+    if channel is None or str(channel.guild.id) != alert["guild_id"]:
+        return
+
+    users = ", ".join(f"<@{user}>" for user in alert["users"])
+    try:
+        await channel.send(
+            f"⚠️ Possível compartilhamento de flag no desafio **{alert['challenge']}**: {users} "
+            f"resolveram com menos de {alert['window']:.0f}s de diferença (pontuação {alert['score']}).",
+            allowed_mentions=discord.AllowedMentions.none()
+        )
+    except Exception:
+        debugger.error(traceback.format_exc())
+
+
+def report_sharing(alert: dict):
+    """Called from the database threads, hands the alert over to the event loop"""
+    asyncio.run_coroutine_threadsafe(send_sharing_alert(alert), client.loop)
+
+
+# Every committed reward is streamed into the flag sharing detector
+sharing_detector = SharingDetector(report_sharing, settings.sharing_window, settings.sharing_min_cluster)
+database.reward_listeners.append(sharing_detector.observe)
 
-# Define bot Permissions
-intents = discord.Intents.all()
-client = commands.Bot(command_prefix='!', intents=intents)
+
+@client.check
+async def guild_only(ctx):
+    """Commands are scoped to a guild, so they can't be used in DMs"""
+    return ctx.guild is not None
+
+
+@client.check
+async def ready_only(ctx):
+    """Commands are answered only after the startup warm-up"""
+    if not warmed_up.is_set():
+        outbox.reply(ctx, "O bot está iniciando, tente novamente em instantes!")
+        return False
+    return True
+
+
+@client.event
+async def on_command_error(ctx, error):
+    """Failed checks already answered the user, anything else is logged"""
+    if isinstance(error, (commands.CheckFailure, commands.CommandNotFound)):
+        return
+    debugger.error("".join(traceback.format_exception(error)))
+
+
+@client.event
+async def setup_hook():
+    """Slash commands are only offered in guilds, so DMs never reach the silent guild_only check"""
+    for command in client.tree.get_commands():
+        command.guild_only = True
+
+
+async def sync_tree() -> int:
+    """Register the slash commands with discord, a rate-limited call done only on demand"""
+    synced = await client.tree.sync()
+    debugger.info(f"Synced {len(synced)} slash commands")
+    return len(synced)
+
+
+@client.before_invoke
+async def defer_interaction(ctx):
+    """Acknowledge slash commands at once, the reply arrives when the work is done"""
+    if ctx.interaction is not None:
+        await ctx.defer(ephemeral=ctx.command.name in private_commands)
 
 
 @client.event
 async def on_ready():
     """Check if the bot is online"""
     print(f'O Bot {client.user} está online!')
+    debugger.info(f"Startup - gateway ready after {(perf_counter() - started_at) * 1000:.0f} ms")
+
+
+async def timed(phase: str, coro):
+    """Await a startup phase and log how long it took"""
+    phase_started = perf_counter()
+    result = await coro
+    debugger.info(f"Startup - {phase}: {result} in {(perf_counter() - phase_started) * 1000:.0f} ms")
+    return result
+
+
+async def connect_database():
+    """Create the database pools, retrying with exponential backoff while MariaDB is unavailable"""
+    delay = 1
+
+    while True:
+        try:
+            await run_db(database.connect)
+            return "connected"
+        except Exception as error:
+            debugger.warning(f"Database connection failed ({error}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+async def warm_up():
+    """Connect the database and warm the caches while the gateway connects, then enable commands"""
+
+    await timed("database", connect_database())
+
+    results = await asyncio.gather(
+        timed("flag stats", run_db(database.warm_flag_stats)),
+        timed("users", run_db(database.warm_users)),
+        timed("rankings", run_db(database.warm_rankings)),
+        return_exceptions=True
+    )
+
+    # A failed warm-up only means a cold cache, the lookups still fall back to the database
+    for result in results:
+        if isinstance(result, Exception):
+            debugger.error("".join(traceback.format_exception(result)))
+
+    warmed_up.set()
+    debugger.info(f"Startup - commands enabled after {(perf_counter() - started_at) * 1000:.0f} ms")
+
+    archive_expired.start()
+    rescore_flags.start()
+    watch_config.start()
 
+    # Syncing is only needed when the commands change, and never delays the gateway connection
+    if settings.sync_commands:
+        await client.wait_until_ready()
+        try:
+            await timed("slash commands", sync_tree())
+        except Exception:
+            debugger.error(traceback.format_exc())
 
-@client.command(aliases=["Register"])
+
+@tasks.loop(hours=1)
+async def archive_expired():
+    """Move challenges past their late window, with rewards and hints, to the archive tables"""
+
+    try:
+        archived = await run_db(database.archive_expired_flags)
+        if archived:
+            debugger.info(f"Archived {archived} expired flags")
+    except Exception:
+        debugger.critical(traceback.format_exc())
+
+
+@tasks.loop(seconds=2)
+async def rescore_flags():
+    """Recompute dynamic challenge values and past solvers' points, once per burst of solves"""
+
+    try:
+        adjusted = await run_db(database.rescore_pending)
+        if adjusted:
+            debugger.info(f"Rescored dynamic flags - {adjusted} users adjusted")
+    except Exception:
+        debugger.critical(traceback.format_exc())
+
+
+# Serializes reloads triggered by !reload and by the file watcher
+reload_lock = asyncio.Lock()
+
+
+def config_mtimes() -> tuple:
+    """Modification times of the .env and config files, None when missing"""
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in config_paths())
+
+
+async def reload_config() -> tuple[set[str], set[str]]:
+    """Read the configuration again and apply only what changed, returning (applied, needs restart)"""
+    global settings, db_executor
+
+    async with reload_lock:
+        new_settings = await asyncio.to_thread(load_config)
+        changed = changed_fields(settings, new_settings)
+
+        # Gateway settings and the flag digest salt only take effect on restart
+        restart = changed & RESTART_FIELDS
+        applied = changed - RESTART_FIELDS
+        new_settings = dataclasses.replace(new_settings, **{name: getattr(settings, name) for name in restart})
+
+        if applied:
+            await run_db(database.apply_config, new_settings, applied)
+
+            if "pool_size" in applied:
+                old_executor, db_executor = db_executor, make_db_executor(new_settings.pool_size)
+                old_executor.shutdown(wait=False)
+
+            sharing_detector.window = new_settings.sharing_window
+            sharing_detector.min_cluster = new_settings.sharing_min_cluster
+
+            settings = new_settings
+            debugger.info(f"Config reloaded: {', '.join(sorted(applied))}")
+
+        if restart:
+            debugger.warning(f"Config changes that need a restart: {', '.join(sorted(restart))}")
+
+        return applied, restart
+
+
+@tasks.loop(seconds=5)
+async def watch_config():
+    """Reload the configuration when the .env or config file changes"""
+
+    mtimes = config_mtimes()
+    if watch_config.mtimes is None:
+        watch_config.mtimes = mtimes
+        return
+
+    if mtimes != watch_config.mtimes:
+        watch_config.mtimes = mtimes
+        try:
+            await reload_config()
+        except Exception:
+            debugger.critical(traceback.format_exc())
+
+
+watch_config.mtimes = None
+
+
+@client.hybrid_command(aliases=["Register"])
 async def register(ctx):
     """Register a member into database"""
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
 
     try:
-        if database.user_exists(user_id):
-            await ctx.reply("Você já está registrado!")
+        if await run_db(database.user_exists, guild_id, user_id):
+            outbox.reply(ctx, "Você já está registrado!")
             return
 
         debugger.info(f"New user register: {user_id} {ctx.author.name}")
 
-        database.user_register(user_id, ctx.author.name)
-        await ctx.reply("Seu perfil foi criado com sucesso!")
+        await run_db(database.user_register, guild_id, user_id, ctx.author.name)
+        outbox.reply(ctx, "Seu perfil foi criado com sucesso!")
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Ocorreu um erro no seu registro! Procure um moderador.")
+        outbox.reply(ctx, "Ocorreu um erro no seu registro! Procure um moderador.")
         return
 
 
-@client.command(aliases=["Ranking", "r"])
+@client.hybrid_command(aliases=["Ranking", "r"])
 async def ranking(ctx):
     """Show 20 top users on points system"""
 
+    guild_id = str(ctx.guild.id)
+
     try:
-        rank = database.ranking_by_points()
+        rank = await run_db(database.ranking_by_points, guild_id)
         ranking_final = "----- Ranking -----\n"
 
-        position = 0
-        for user_point in rank:
+        for position, user_point in enumerate(rank, start=1):
             ranking_final += f"{position}. {user_point['nickname']} - {user_point['points']} pontos\n"
 
-        # Handles discord char limits
-        if len(ranking_final) > 2000:
-            ranking_final = ranking_final[:1997] + "..."
-
-        await ctx.reply(ranking_final)
+        outbox.reply(ctx, ranking_final)
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Ocorreu um erro ao gerar o ranking!\nContate um moderador")
+        outbox.reply(ctx, "Ocorreu um erro ao gerar o ranking!\nContate um moderador")
         return
 
 
-@client.command(aliases=["RankingEvent", "re"])
+@client.hybrid_command(aliases=["RankingEvent", "re"])
 async def ranking_by_event(ctx, attempt: str):
     """Show 20 top users inside a event on points system"""
 
+    guild_id = str(ctx.guild.id)
+
     try:
-        rank = database.ranking_by_event(attempt)
+        rank = await run_db(database.ranking_by_event, guild_id, attempt)
         ranking_final = "----- Ranking -----\n"
 
-        position = 0
-        for user_point in rank:
+        for position, user_point in enumerate(rank, start=1):
             ranking_final += f"{position}. {user_point['nickname']} - {user_point['total_points']} pontos\n"
 
-        # Handles discord char limits
-        if len(ranking_final) > 2000:
-            ranking_final = ranking_final[:1997] + "..."
-
-        await ctx.reply(ranking_final)
+        outbox.reply(ctx, ranking_final)
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Ocorreu um erro ao gerar o ranking!\nContate um moderador")
+        outbox.reply(ctx, "Ocorreu um erro ao gerar o ranking!\nContate um moderador")
         return
 
 
-@client.command(aliases=["RankingSemanal", "rs"])
+@client.hybrid_command(aliases=["RankingSemanal", "rs"])
 async def ranking_weekly(ctx):
     """Show 20 top users inside a weekly chalenges on points system"""
 
@@ -112,71 +366,108 @@ async def ranking_weekly(ctx):
     return
 
 
-@client.command(aliases=["MakeFlag", "mf"])
-async def make_flag(ctx, name_flag: str, flag_str: str, points_flag: str, event_name: str | None = None):
-    """Make a flag if user is admin"""
+@client.hybrid_command(aliases=["MakeFlag", "mf"])
+async def make_flag(ctx, name_flag: str, flag_str: str, points_flag: str, event_name: str | None = None,
+                    minimum_points: str | None = None, decay: str | None = None):
+    """Make a flag if user is admin, with dynamic scoring when minimum_points and decay are given"""
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
-    debugger.info(f"Make flag attempt - {user_id} - {name_flag} - {flag_str} - {points_flag} - {event_name}")
+    debugger.info(f"Make flag attempt - {user_id} - {name_flag} - {points_flag} - {event_name}")
 
     try:
-        if not database.user_is_admin(user_id):
-            await ctx.reply("Você não tem permissões de administrador!")
+        if not await run_db(database.user_is_admin, guild_id, user_id):
+            outbox.reply(ctx, "Você não tem permissões de administrador!")
             return
 
         if not str(points_flag).isnumeric():
-            await ctx.reply("O valor de `points_flag` deve ser um número!")
+            outbox.reply(ctx, "O valor de `points_flag` deve ser um número!")
+            return
+
+        if (minimum_points is None) != (decay is None):
+            outbox.reply(ctx, "Para pontuação dinâmica informe `minimum_points` e `decay`!")
             return
 
-        if database.create_flag(name_flag, flag_str, int(points_flag), event_name, user_id) is None:
-            await ctx.reply("A `flag` ou `NameFlag` que você tentou criar já existia!")
+        if minimum_points is not None:
+            if not str(minimum_points).isnumeric() or not str(decay).isnumeric() or int(decay) == 0:
+                outbox.reply(ctx, "Os valores de `minimum_points` e `decay` devem ser números e `decay` maior que zero!")
+                return
+
+            if int(minimum_points) > int(points_flag):
+                outbox.reply(ctx, "O valor de `minimum_points` não pode ser maior que `points_flag`!")
+                return
+
+            minimum_points, decay = int(minimum_points), int(decay)
+
+        if await run_db(database.create_flag, guild_id, name_flag, flag_str, int(points_flag), event_name, user_id,
+                        minimum_points, decay) is None:
+            outbox.reply(ctx, "A `flag` ou `NameFlag` que você tentou criar já existia!")
             return
 
-        await ctx.reply(f"A flag {name_flag} foi criada com sucesso!")
+        outbox.reply(ctx, f"A flag {name_flag} foi criada com sucesso!")
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Ocorreu um erro ao criar a flag!\nContate um moderador")
+        outbox.reply(ctx, "Ocorreu um erro ao criar a flag!\nContate um moderador")
         return
 
 
-@client.command(aliases=["Flag", "f"])
+@client.hybrid_command(aliases=["Flag", "f"])
 async def flag(ctx, attempt: str):
     """Claims a Flag"""
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
-    debugger.info(f"Flag reward attempt - {user_id} - {attempt}")
+    digest = database.flag_digest(attempt)
+    debugger.info(f"Flag reward attempt - {user_id} - {digest.hex()[:16]}")
+
+    started = perf_counter()
+
+    def record(result: str):
+        attempt_log.record(guild_id, user_id, digest, result, int((perf_counter() - started) * 1000))
 
     try:
-        if not database.user_exists(user_id):
-            await ctx.reply("Você não está registrado! Use !Register primeiro.")
+        if not await run_db(database.user_exists, guild_id, user_id):
+            record("unregistered")
+            outbox.reply(ctx, "Você não está registrado! Use !Register primeiro.")
             return
 
-        try_reward = database.reward_flag(user_id, attempt)
+        try_reward = await run_db(database.reward_flag, guild_id, user_id, attempt)
 
         if try_reward is None:
-            await ctx.reply("Flag incorreta!")
+            record("incorrect")
+            outbox.reply(ctx, "Flag incorreta!")
             return
 
-        await ctx.reply(try_reward)
+        record("correct")
+        outbox.reply(ctx, try_reward)
         return
 
     except AssertionError:
-        await ctx.reply("Você já resgatou esta flag!")
+        record("duplicate")
+        outbox.reply(ctx, "Você já resgatou esta flag!")
+        return
+
+    except FlagExpiredError as expired:
+        record("expired")
+        outbox.reply(ctx, str(expired))
         return
 
     except Exception as error:
+        record("error")
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Ocorreu um erro ao resgatar a flag!\nContate um moderador")
+        outbox.reply(ctx, "Ocorreu um erro ao resgatar a flag!\nContate um moderador")
         return
 
 
-@client.command(aliases=["ActiveFlags", "af"])
+@client.hybrid_command(aliases=["ActiveFlags", "af"])
 async def active_flags(ctx):
     """Get all active flags and expiration date"""
 
+    guild_id = str(ctx.guild.id)
+
     try:
-        flags = database.get_flags()
+        flags = await run_db(database.get_flags, guild_id)
 
         response_final = f"```{'Desafio':<20} | {'Pontos':<5} | {'Evento':<25} | {'Validade'}\n"
         response_final += "-" * 70 + "\n"  # linha de separação
@@ -186,31 +477,28 @@ async def active_flags(ctx):
 
         response_final += "```"
 
-        # Handles discord char limits
-        if len(response_final) > 2000:
-            response_final = response_final[:1994] + "...\n```"
-
-        await ctx.reply(response_final)
+        outbox.reply(ctx, response_final)
         return
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Ocorreu um erro ao consultar as flags!\nContate um moderador")
+        outbox.reply(ctx, "Ocorreu um erro ao consultar as flags!\nContate um moderador")
         return
 
 
-@client.command(aliases=["RemainingFlags", "rf"])
+@client.hybrid_command(aliases=["RemainingFlags", "rf"])
 async def remaining_flags(ctx):
     """Get all active flags remaining for the user and the expiration date"""
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
     now = datetime.now()
 
     try:
-        flags = database.get_remaining_flags(user_id)
+        flags = await run_db(database.get_remaining_flags, guild_id, user_id)
 
         if len(flags) == 0:
-            await ctx.reply("Parabéns! Não há nenhuma flag ativa que você deixou de capturar!")
+            outbox.reply(ctx, "Parabéns! Não há nenhuma flag ativa que você deixou de capturar!")
             return
 
         response_final = f"```{'Desafio':<20} | {'Pontos':<5} | {'Evento':<25} | {'Validade'}\n"
@@ -226,179 +514,477 @@ async def remaining_flags(ctx):
 
         response_final += "```"
 
-        # Handles discord char limits
-        if len(response_final) > 2000:
-            response_final = response_final[:1994] + "...\n```"
-
-        await ctx.reply(response_final)
+        outbox.reply(ctx, response_final)
         return
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Ocorreu um erro ao consultar as flags!\nContate um moderador")
+        outbox.reply(ctx, "Ocorreu um erro ao consultar as flags!\nContate um moderador")
         return
 
 
-@client.command(aliases=["Solves", "s"])
+@client.hybrid_command(aliases=["Solves", "s"])
 async def solves(ctx, challenge: str):
     """Show how many solutions the challange have actualy"""
 
+    guild_id = str(ctx.guild.id)
+
     try:
-        flag_solves = database.get_rewards_number_flag(challenge)
-        await ctx.reply(f"Atualmente o desafio {challenge} tem {flag_solves} soluções!")
+        flag_solves = await run_db(database.get_rewards_number_flag, guild_id, challenge)
+        outbox.reply(ctx, f"Atualmente o desafio {challenge} tem {flag_solves} soluções!")
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Erro ao consultar as soluções!\nContate um administrador")
+        outbox.reply(ctx, "Erro ao consultar as soluções!\nContate um administrador")
         return
 
 
-@client.command(aliases=["First", "fs"])
+@client.hybrid_command(aliases=["First", "fs"])
 async def first(ctx, challenge: str):
     """Shows who is the first to win a challenge"""
 
+    guild_id = str(ctx.guild.id)
+
     try:
-        first_solve = database.get_blooded_flag(challenge)
+        first_solve = await run_db(database.get_blooded_flag, guild_id, challenge)
 
         if first_solve is None:
-            await ctx.reply(f"Ninguém resolveu o desafio {challenge} ainda!")
+            outbox.reply(ctx, f"Ninguém resolveu o desafio {challenge} ainda!")
             return
 
-        await ctx.reply(
+        outbox.reply(ctx, 
             f"<@{first_solve['id']}> foi o primeiro a resolver o desafio __{challenge}__! Solucionado em: {first_solve['solved_at']}")
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Erro ao consultar as soluções!\nContate um administrador")
+        outbox.reply(ctx, "Erro ao consultar as soluções!\nContate um administrador")
         return
 
 
-@client.command(aliases=["Points", "p"])
+@client.hybrid_command(aliases=["Profile", "pf"])
+async def profile(ctx):
+    """Show the user's points, coins, rankings, solves and remaining flags"""
+
+    guild_id = str(ctx.guild.id)
+    user_id = str(ctx.author.id)
+
+    try:
+        user_profile = await run_db(database.get_user_profile, guild_id, user_id)
+
+        if user_profile is None:
+            outbox.reply(ctx, "Você não está registrado! Use !Register primeiro.")
+            return
+
+        response_final = f"----- Perfil de {ctx.author.name} -----\n"
+        response_final += f"Pontos: {user_profile['points']}\n"
+        response_final += f"Moedas: {user_profile['coins']}\n"
+        response_final += f"Ranking geral: {user_profile['rank']}º\n"
+        response_final += f"Desafios resolvidos: {user_profile['solves']}\n"
+        response_final += f"Flags ativas restantes: {user_profile['remaining_flags']} " \
+                          f"({user_profile['remaining_points']} pontos)\n"
+
+        for event in user_profile['events']:
+            response_final += f"{event['event']}: {event['rank']}º - {event['points']} pontos\n"
+
+        outbox.reply(ctx, response_final)
+
+    except Exception as error:
+        debugger.critical(traceback.format_exc())
+        outbox.reply(ctx, "Erro ao consultar o perfil!\nContate um administrador")
+        return
+
+
+@client.hybrid_command(aliases=["Points", "p"])
 async def points(ctx):
     """Show how many points the user have"""
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
 
     try:
-        user_points = database.get_user_points(user_id)
-        await ctx.reply(f"Você atualmente tem {user_points} pontos!")
+        user_profile = await run_db(database.get_user_profile, guild_id, user_id)
+
+        if user_profile is None:
+            outbox.reply(ctx, "Você não está registrado! Use !Register primeiro.")
+            return
+
+        outbox.reply(ctx, f"Você atualmente tem {user_profile['points']} pontos! ({user_profile['rank']}º no ranking)")
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Erro ao consultar os pontos!\nContate um administrador")
+        outbox.reply(ctx, "Erro ao consultar os pontos!\nContate um administrador")
         return
 
 
-@client.command(aliases=["Coins", "c"])
+@client.hybrid_command(aliases=["Coins", "c"])
 async def coins(ctx):
     """Show how many coins the user have"""
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
 
     try:
-        user_coins = database.get_user_coins(user_id)
-        await ctx.reply(f"Você atualmente tem {user_coins} moedas!")
+        user_profile = await run_db(database.get_user_profile, guild_id, user_id)
+
+        if user_profile is None:
+            outbox.reply(ctx, "Você não está registrado! Use !Register primeiro.")
+            return
+
+        outbox.reply(ctx, f"Você atualmente tem {user_profile['coins']} moedas!")
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Erro ao consultar os pontos!\nContate um administrador")
+        outbox.reply(ctx, "Erro ao consultar os pontos!\nContate um administrador")
         return
 
 
-@client.command(aliases=["HasHints", "hh"])
+@client.hybrid_command(aliases=["HasHints", "hh"])
 async def has_hints(ctx, challenge: str):
     """Show if a challenge has hints available"""
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
 
     try:
-        search = database.exists_hint_flag(challenge)
+        search = await run_db(database.exists_hint_flag, guild_id, challenge)
+
+        response = []
 
         if search[0]:
-            await ctx.reply(f"Uma dica normal está disponível para {challenge} por 1000 moedas!")
+            response.append(f"Uma dica normal está disponível para {challenge} por {settings.hint_price_basic} moedas!")
 
         if search[1]:
-            await ctx.reply(f"Uma dica plus está disponível para {challenge} por 2000 moedas!")
+            response.append(f"Uma dica plus está disponível para {challenge} por {settings.hint_price_plus} moedas!")
+
+        if not response:
+            response.append(f"Atualmente o desafio {challenge} não tem dicas.")
+
+        outbox.reply(ctx, *response)
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Erro ao consultar as dicas!\nContate um administrador")
+        outbox.reply(ctx, "Erro ao consultar as dicas!\nContate um administrador")
         return
 
 
-@client.command(aliases=["CreateHints", "ch"])
+@client.hybrid_command(aliases=["CreateHints", "ch"])
 async def create_hints(ctx, challenge: str, type_hint: str, text: str):
     """Create a hint from a challenge if user is admin."""
 
     if not (type_hint == "basic" or type_hint == "plus"):
-        await ctx.reply("O parâmetro type_hint deve ser 'basic' ou 'plus'.")
+        outbox.reply(ctx, "O parâmetro type_hint deve ser 'basic' ou 'plus'.")
         return
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
 
     try:
-        if not database.user_is_admin(user_id):
-            await ctx.reply("Você deve ter permissões administrativas para este comando!")
+        if not await run_db(database.user_is_admin, guild_id, user_id):
+            outbox.reply(ctx, "Você deve ter permissões administrativas para este comando!")
             return
 
-        search = database.exists_hint_flag(challenge)
+        search = await run_db(database.exists_hint_flag, guild_id, challenge)
 
         if search[0] and type_hint == 'basic':
-            await ctx.reply(f"Uma dica 'basic' já está disponível para {challenge}!")
+            outbox.reply(ctx, f"Uma dica 'basic' já está disponível para {challenge}!")
             return
 
         if search[1] and type_hint == 'plus':
-            await ctx.reply(f"Uma dica 'plus' já está disponível para {challenge}!")
+            outbox.reply(ctx, f"Uma dica 'plus' já está disponível para {challenge}!")
             return
 
-        database.create_hint(challenge, type_hint == 'plus', text)
-        await ctx.reply(f"Você criou uma dica {type_hint} com sucesso para {challenge}!")
+        if not await run_db(database.create_hint, guild_id, challenge, type_hint == 'plus', text):
+            outbox.reply(ctx, f"O desafio {challenge} não existe!")
+            return
+
+        outbox.reply(ctx, f"Você criou uma dica {type_hint} com sucesso para {challenge}!")
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Erro ao consultar as dicas!\nContate um administrador")
+        outbox.reply(ctx, "Erro ao consultar as dicas!\nContate um administrador")
         return
 
 
-@client.command(aliases=["Hint", "h"])
+@client.hybrid_command(aliases=["Hint", "h"])
 async def hint(ctx, challenge: str, type_hint: str):
     """Reward a Hint plus or basic (type) for a challenge using coins"""
 
     if not (type_hint == "plus" or type_hint == "basic"):
-        await ctx.reply(f"Não consegui entender o tipo da dica desejada! Atualmente temos os tipos 'basic' e 'plus'")
+        outbox.reply(ctx, f"Não consegui entender o tipo da dica desejada! Atualmente temos os tipos 'basic' e 'plus'")
         return
 
+    guild_id = str(ctx.guild.id)
     user_id = str(ctx.author.id)
     debugger.info(f"Hint reward attempt - {user_id} - {challenge} - {type_hint}")
 
     try:
         is_plus = type_hint == 'plus'
 
-        user_coins = database.get_user_coins(user_id)
-        require = 2000 if is_plus else 1000
+        user_coins = await run_db(database.get_user_coins, guild_id, user_id)
+        require = settings.hint_price_plus if is_plus else settings.hint_price_basic
 
         if user_coins < require:
-            await ctx.reply(f"Você não tem moedas suficientes para esta operação! Saldo: {user_coins}")
+            outbox.reply(ctx, f"Você não tem moedas suficientes para esta operação! Saldo: {user_coins}")
             return
 
-        exist_hint = database.exists_hint_flag(challenge)
+        exist_hint = await run_db(database.exists_hint_flag, guild_id, challenge)
 
         if is_plus and not exist_hint[1]:
-            await ctx.reply(f"Atualmente o desafio {challenge} não tem dicas 'plus'.")
+            outbox.reply(ctx, f"Atualmente o desafio {challenge} não tem dicas 'plus'.")
             return
 
         if not is_plus and not exist_hint[0]:
-            await ctx.reply(f"Atualmente o desafio {challenge} não tem dicas 'basic'.")
+            outbox.reply(ctx, f"Atualmente o desafio {challenge} não tem dicas 'basic'.")
             return
 
-        database.subtract_user_coins(user_id, require)
-        hint_txt = database.get_hint_flag(challenge, is_plus)
-        await ctx.reply(hint_txt)
+        await run_db(database.subtract_user_coins, guild_id, user_id, require)
+        hint_txt = await run_db(database.get_hint_flag, guild_id, challenge, is_plus)
+        outbox.reply(ctx, hint_txt)
 
     except Exception as error:
         debugger.critical(traceback.format_exc())
-        await ctx.reply("Erro ao consultar os pontos!\nContate um administrador")
+        outbox.reply(ctx, "Erro ao consultar os pontos!\nContate um administrador")
+        return
+
+
+@client.hybrid_command(aliases=["Export", "ex"])
+async def export_data(ctx, kind: str, fmt: str = "csv", event_name: str | None = None):
+    """Export the scoreboard, an event result or the rewards history as a compressed file if user is admin"""
+
+    if kind not in EXPORTS or fmt not in FORMATS:
+        outbox.reply(ctx, f"Uso: !export <{'|'.join(EXPORTS)}> [{'|'.join(FORMATS)}] [evento]")
         return
 
+    if kind == "event" and not event_name:
+        outbox.reply(ctx, "Informe o nome do evento a ser exportado!")
+        return
+
+    guild_id = str(ctx.guild.id)
+    user_id = str(ctx.author.id)
+    debugger.info(f"Export attempt - {user_id} - {kind} - {fmt} - {event_name}")
+
+    try:
+        if not await run_db(database.user_is_admin, guild_id, user_id):
+            outbox.reply(ctx, "Você deve ter permissões administrativas para este comando!")
+            return
+
+        # Rows are streamed from the database straight into a temporary file
+        with tempfile.TemporaryFile() as fileobj:
+            total = await run_db(export, database, kind, guild_id, fmt, fileobj, event_name)
+
+            if fileobj.tell() > ctx.guild.filesize_limit:
+                outbox.reply(ctx, "O arquivo exportado excede o limite de anexos do servidor! Use `python export.py`.")
+                return
+
+            fileobj.seek(0)
+            await ctx.reply(f"{total} linhas exportadas.", file=discord.File(fileobj, filename=f"{kind}.{fmt}.gz"))
+
+    except Exception as error:
+        debugger.critical(traceback.format_exc())
+        outbox.reply(ctx, "Erro ao exportar os dados!\nContate um administrador")
+        return
+
+
+@client.hybrid_command(aliases=["Reload"])
+async def reload(ctx):
+    """Reload the configuration without restarting if user is admin"""
+
+    guild_id = str(ctx.guild.id)
+    user_id = str(ctx.author.id)
+
+    try:
+        if not await run_db(database.user_is_admin, guild_id, user_id):
+            outbox.reply(ctx, "Você deve ter permissões administrativas para este comando!")
+            return
+
+        applied, restart = await reload_config()
+
+        response = [f"Configuração recarregada: {', '.join(sorted(applied)) if applied else 'nenhuma alteração'}."]
+
+        if restart:
+            response.append(f"Exigem reiniciar o bot: {', '.join(sorted(restart))}.")
+
+        outbox.reply(ctx, *response)
+
+    except Exception as error:
+        debugger.critical(traceback.format_exc())
+        outbox.reply(ctx, "Erro ao recarregar a configuração! A configuração anterior foi mantida.")
+        return
+
+
+@client.hybrid_command(aliases=["Sync"])
+async def sync_commands(ctx):
+    """Register the slash commands with discord if user is admin"""
+
+    guild_id = str(ctx.guild.id)
+    user_id = str(ctx.author.id)
+
+    try:
+        if not await run_db(database.user_is_admin, guild_id, user_id):
+            outbox.reply(ctx, "Você deve ter permissões administrativas para este comando!")
+            return
+
+        outbox.reply(ctx, f"{await sync_tree()} comandos de barra sincronizados com o discord.")
+
+    except Exception as error:
+        debugger.critical(traceback.format_exc())
+        outbox.reply(ctx, "Erro ao sincronizar os comandos de barra!\nContate um administrador")
+        return
+
+
+@client.hybrid_command(aliases=["DbStats", "dbs"])
+async def db_stats(ctx):
+    """Show request coalescing metrics if user is admin"""
+
+    guild_id = str(ctx.guild.id)
+    user_id = str(ctx.author.id)
+
+    try:
+        if not await run_db(database.user_is_admin, guild_id, user_id):
+            outbox.reply(ctx, "Você deve ter permissões administrativas para este comando!")
+            return
+
+        stats = database.coalesce_stats()
+
+        response_final = f"```{'Método':<22} | {'Chamadas':<9} | {'Consultas':<9} | {'Razão'}\n"
+        response_final += "-" * 60 + "\n"
+
+        for method, metrics in sorted(stats.items()):
+            response_final += f"{method:<22} | {metrics['calls']:<9} | {metrics['queries']:<9} | {metrics['ratio']:.2f}\n"
+
+        response_final += "```"
+
+        outbox.reply(ctx, response_final)
+
+    except Exception as error:
+        debugger.critical(traceback.format_exc())
+        outbox.reply(ctx, "Erro ao consultar as métricas!\nContate um administrador")
+        return
+
+
+# Profiling session started by !diag (its event stops it early) and the event loop watchdog
+diag_session: asyncio.Event | None = None
+loop_watchdog: LoopWatchdog | None = None
+
+
+def report_block(duration: float, stack: str):
+    """Called from the watchdog thread for every event loop block over the threshold"""
+    debugger.warning(f"Event loop blocked for {duration * 1000:.0f} ms - {stack}")
+
+
+@client.hybrid_command(aliases=["Diag"])
+async def diag(ctx, action: str, value: int | None = None):
+    """Profile the bot or watch the event loop for blocking callbacks if user is admin"""
+    global diag_session, loop_watchdog
+
+    guild_id = str(ctx.guild.id)
+    user_id = str(ctx.author.id)
+
+    try:
+        if not await run_db(database.user_is_admin, guild_id, user_id):
+            outbox.reply(ctx, "Você deve ter permissões administrativas para este comando!")
+            return
+
+        action = action.lower()
+
+        if action in ("sample", "cprofile"):
+            if diag_session is not None:
+                outbox.reply(ctx, "Já existe uma sessão de profiling em andamento! Use `!diag stop` para encerrá-la.")
+                return
+
+            seconds = 30 if value is None else value
+            if not 1 <= seconds <= 300:
+                outbox.reply(ctx, "A duração da sessão deve ser de 1 a 300 segundos!")
+                return
+
+            profiler = SamplingProfiler() if action == "sample" else LoopProfiler()
+
+            diag_session = asyncio.Event()
+            debugger.info(f"Profiling started - {user_id} - {action} - {seconds}s")
+            profiler.start()
+            try:
+                await asyncio.wait_for(diag_session.wait(), seconds)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                diag_session = None
+                result = profiler.stop()
+
+            if action == "sample":
+                files = [discord.File(io.BytesIO(result.encode("utf-8")), filename="perfil.folded")]
+                message = "Amostras de todas as threads no formato folded (flamegraph.pl, speedscope)."
+            else:
+                stats, summary = result
+                files = [
+                    discord.File(io.BytesIO(stats), filename="perfil.prof"),
+                    discord.File(io.BytesIO(summary.encode("utf-8")), filename="perfil.txt")
+                ]
+                message = "cProfile da thread do event loop (snakeviz, flameprof) e resumo por tempo acumulado."
+
+            await ctx.reply(message, files=files)
+
+        elif action == "stop":
+            if diag_session is None:
+                outbox.reply(ctx, "Nenhuma sessão de profiling em andamento!")
+                return
+            diag_session.set()
+            outbox.reply(ctx, "Encerrando a sessão de profiling...")
+
+        elif action == "watch":
+            if loop_watchdog is not None:
+                outbox.reply(ctx, "O watchdog do event loop já está ativo! Use `!diag unwatch` para encerrá-lo.")
+                return
+
+            threshold = (250 if value is None else value) / 1000
+            if not 0.01 <= threshold <= 10:
+                outbox.reply(ctx, "O limite do watchdog deve ser de 10 a 10000 ms!")
+                return
+
+            loop_watchdog = LoopWatchdog(report_block, threshold)
+            loop_watchdog.start()
+            outbox.reply(ctx, f"Watchdog ativo: bloqueios do event loop acima de {threshold * 1000:.0f} ms serão registrados.")
+
+        elif action == "unwatch":
+            if loop_watchdog is None:
+                outbox.reply(ctx, "O watchdog do event loop não está ativo!")
+                return
+
+            watchdog, loop_watchdog = loop_watchdog, None
+            folded = watchdog.stop()
+
+            if not folded:
+                outbox.reply(ctx, "Watchdog encerrado, nenhum bloqueio do event loop foi registrado.")
+                return
+
+            await ctx.reply(
+                f"Watchdog encerrado, {len(watchdog.blocks)} bloqueios (pilha e duração em ms, formato folded).",
+                file=discord.File(io.BytesIO(folded.encode("utf-8")), filename="bloqueios.folded")
+            )
+
+        else:
+            outbox.reply(ctx, "Use `!diag sample|cprofile [segundos]`, `!diag stop`, `!diag watch [ms]` ou `!diag unwatch`.")
+
+    except Exception as error:
+        debugger.critical(traceback.format_exc())
+        outbox.reply(ctx, "Erro ao executar o diagnóstico!\nContate um administrador")
+        return
+
+
+async def main():
+    """Connect the gateway and warm up the database concurrently"""
+    async with client:
+        startup = asyncio.create_task(warm_up())
+        try:
+            await client.start(settings.dc_key)
+        finally:
+            startup.cancel()
+
+
+discord.utils.setup_logging()
 
-client.run(bot_id)
+try:
+    asyncio.run(main())
+except KeyboardInterrupt:
+    pass
+finally:
+    attempt_log.close()
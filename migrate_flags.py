@@ -0,0 +1,7 @@
+from fireuai_db import FireuaiDB
+from config import load_config
+
+# Converte as flags em texto puro para `flag_hash` (ver migrations/002_flag_hash.sql)
+database = FireuaiDB.from_config(load_config())
+
+print(f"{database.migrate_flag_hashes()} flags migradas.")
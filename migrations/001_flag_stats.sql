@@ -0,0 +1,32 @@
+-- Estatísticas por desafio mantidas dentro da transação de resgate (reward_flag).
+-- Substitui o COUNT(*) de !s e a ordenação de rewards de !fs.
+
+CREATE TABLE IF NOT EXISTS flag_stats (
+    flag_id          INT         NOT NULL PRIMARY KEY,
+    solves           INT         NOT NULL DEFAULT 0,
+    first_blood_user VARCHAR(32) NULL,
+    first_blood_at   DATETIME    NULL
+);
+
+-- Preenche as estatísticas das flags já existentes
+INSERT INTO flag_stats (flag_id, solves, first_blood_user, first_blood_at)
+SELECT
+    f.id,
+    (SELECT COUNT(*) FROM rewards r WHERE r.flag_id = f.id),
+    fb.user_id,
+    fb.detetime
+FROM flags f
+LEFT JOIN (
+    SELECT
+        r.flag_id,
+        r.user_id,
+        r.detetime,
+        ROW_NUMBER() OVER (PARTITION BY r.flag_id ORDER BY r.detetime ASC) AS position
+    FROM rewards r
+    INNER JOIN users u ON r.user_id = u.id
+    WHERE u.permission != 1
+) fb ON fb.flag_id = f.id AND fb.position = 1
+ON DUPLICATE KEY UPDATE
+    solves = VALUES(solves),
+    first_blood_user = VALUES(first_blood_user),
+    first_blood_at = VALUES(first_blood_at);
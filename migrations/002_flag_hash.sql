@@ -0,0 +1,8 @@
+-- Flags passam a ser armazenadas como digest de largura fixa (SHA-256 ou HMAC-SHA256).
+-- Após aplicar este script, execute `python migrate_flags.py` para converter as flags
+-- existentes e, em seguida, `003_drop_plain_flag.sql`.
+
+ALTER TABLE flags
+    ADD COLUMN flag_hash BINARY(32) NULL AFTER flag,
+    ADD UNIQUE KEY uq_flags_flag_hash (flag_hash),
+    MODIFY flag VARCHAR(255) NULL;
@@ -0,0 +1,5 @@
+-- Remove a coluna com as flags em texto puro (aplicar após `python migrate_flags.py`).
+
+ALTER TABLE flags
+    DROP COLUMN flag,
+    MODIFY flag_hash BINARY(32) NOT NULL;
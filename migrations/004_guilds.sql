@@ -0,0 +1,57 @@
+-- Multi-servidor: todas as tabelas passam a ter `guild_id` como primeira coluna das chaves.
+-- Os dados existentes são atribuídos ao servidor definido abaixo.
+
+SET @legacy_guild = 'ID_DO_SERVIDOR';
+
+ALTER TABLE users
+    ADD COLUMN guild_id VARCHAR(32) NOT NULL DEFAULT '' FIRST;
+ALTER TABLE event
+    ADD COLUMN guild_id VARCHAR(32) NOT NULL DEFAULT '' FIRST;
+ALTER TABLE flags
+    ADD COLUMN guild_id VARCHAR(32) NOT NULL DEFAULT '' FIRST;
+ALTER TABLE rewards
+    ADD COLUMN guild_id VARCHAR(32) NOT NULL DEFAULT '' FIRST;
+ALTER TABLE hints
+    ADD COLUMN guild_id VARCHAR(32) NOT NULL DEFAULT '' FIRST;
+ALTER TABLE flag_stats
+    ADD COLUMN guild_id VARCHAR(32) NOT NULL DEFAULT '' FIRST;
+
+UPDATE users SET guild_id = @legacy_guild;
+UPDATE event SET guild_id = @legacy_guild;
+UPDATE flags SET guild_id = @legacy_guild;
+UPDATE rewards SET guild_id = @legacy_guild;
+UPDATE hints SET guild_id = @legacy_guild;
+UPDATE flag_stats SET guild_id = @legacy_guild;
+
+-- Um mesmo usuário do discord tem um perfil por servidor
+ALTER TABLE users
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (guild_id, id),
+    ADD INDEX idx_users_guild_points (guild_id, permission, points);
+
+-- Nomes de eventos e desafios, e as flags, são únicos dentro do servidor
+ALTER TABLE event
+    DROP INDEX IF EXISTS name,
+    ADD UNIQUE KEY uq_event_guild_name (guild_id, name);
+
+ALTER TABLE flags
+    DROP INDEX IF EXISTS name,
+    DROP INDEX IF EXISTS uq_flags_flag_hash,
+    ADD UNIQUE KEY uq_flags_guild_hash (guild_id, flag_hash),
+    ADD UNIQUE KEY uq_flags_guild_name (guild_id, name),
+    ADD INDEX idx_flags_guild_expiration (guild_id, expiration);
+
+ALTER TABLE rewards
+    ADD UNIQUE KEY uq_rewards_guild_user_flag (guild_id, user_id, flag_id),
+    ADD INDEX idx_rewards_guild_flag (guild_id, flag_id);
+
+ALTER TABLE hints
+    ADD INDEX idx_hints_guild_flag (guild_id, flag_id);
+
+ALTER TABLE flag_stats
+    ADD INDEX idx_flag_stats_guild (guild_id, flag_id);
+
+-- Opcional: particionar as tabelas maiores por servidor. Exige que a chave primária
+-- contenha `guild_id` e que a tabela não tenha chaves estrangeiras.
+-- ALTER TABLE rewards PARTITION BY KEY (guild_id) PARTITIONS 16;
+-- ALTER TABLE users PARTITION BY KEY (guild_id) PARTITIONS 16;
@@ -0,0 +1,14 @@
+-- Registro estruturado de todas as tentativas de !f, gravado em lotes pelo AttemptLog (audit.py).
+
+CREATE TABLE IF NOT EXISTS attempts (
+    id         BIGINT      NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    guild_id   VARCHAR(32) NOT NULL,
+    user_id    VARCHAR(32) NOT NULL,
+    digest     BINARY(32)  NOT NULL,
+    result     ENUM('correct', 'incorrect', 'duplicate', 'expired', 'unregistered', 'error') NOT NULL,
+    latency_ms INT         NOT NULL,
+    created_at DATETIME(3) NOT NULL,
+    INDEX idx_attempts_guild_time (guild_id, created_at),
+    INDEX idx_attempts_guild_user (guild_id, user_id, created_at),
+    INDEX idx_attempts_guild_digest (guild_id, digest)
+);
@@ -0,0 +1,21 @@
+-- Tabelas de arquivo para desafios cujo prazo de atraso terminou (ver FireuaiDB.archive_expired_flags)
+-- e totais por usuário e evento preservados para os rankings de eventos antigos.
+
+CREATE TABLE IF NOT EXISTS flags_archive LIKE flags;
+CREATE TABLE IF NOT EXISTS rewards_archive LIKE rewards;
+CREATE TABLE IF NOT EXISTS hints_archive LIKE hints;
+
+-- Um nome de desafio pode ser reutilizado depois que o anterior foi arquivado
+ALTER TABLE flags_archive
+    DROP INDEX IF EXISTS uq_flags_guild_name,
+    DROP INDEX IF EXISTS uq_flags_guild_hash,
+    ADD INDEX idx_flags_archive_guild_name (guild_id, name);
+
+CREATE TABLE IF NOT EXISTS event_user_totals (
+    guild_id     VARCHAR(32) NOT NULL,
+    event_id     INT         NOT NULL,
+    user_id      VARCHAR(32) NOT NULL,
+    total_points INT         NOT NULL DEFAULT 0,
+    solves       INT         NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, event_id, user_id)
+);
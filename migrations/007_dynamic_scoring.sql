@@ -0,0 +1,15 @@
+-- Pontuação dinâmica (ver FireuaiDB.rescore_flags): o valor de `flags.points` cai a cada resgate
+-- de `initial_points` até `minimum_points` e os resgates anteriores são ajustados.
+-- As colunas também entram em flags_archive, que é copiada com SELECT *.
+
+ALTER TABLE flags
+    ADD COLUMN IF NOT EXISTS dynamic        TINYINT(1) NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS initial_points INT        NULL,
+    ADD COLUMN IF NOT EXISTS minimum_points INT        NULL,
+    ADD COLUMN IF NOT EXISTS decay          INT        NULL;
+
+ALTER TABLE flags_archive
+    ADD COLUMN IF NOT EXISTS dynamic        TINYINT(1) NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS initial_points INT        NULL,
+    ADD COLUMN IF NOT EXISTS minimum_points INT        NULL,
+    ADD COLUMN IF NOT EXISTS decay          INT        NULL;
@@ -0,0 +1,13 @@
+-- Estatísticas dos desafios arquivados saem de flag_stats junto com a flag (ver FireuaiDB.archive_expired_flags),
+-- e flags_archive ganha um índice pelo digest para que !f informe que uma flag antiga expirou.
+
+CREATE TABLE IF NOT EXISTS flag_stats_archive LIKE flag_stats;
+
+-- Move as estatísticas dos desafios arquivados antes desta migração
+INSERT IGNORE INTO flag_stats_archive
+SELECT s.* FROM flag_stats s INNER JOIN flags_archive f ON f.id = s.flag_id;
+
+DELETE s FROM flag_stats s INNER JOIN flags_archive f ON f.id = s.flag_id;
+
+ALTER TABLE flags_archive
+    ADD INDEX IF NOT EXISTS idx_flags_archive_guild_hash (guild_id, flag_hash);
@@ -0,0 +1,16 @@
+-- Resgates de jogadores (sem administradores) por desafio, usados no decaimento da pontuação dinâmica.
+-- A coluna também entra em flag_stats_archive, que é copiada com SELECT *.
+
+ALTER TABLE flag_stats
+    ADD COLUMN IF NOT EXISTS player_solves INT NOT NULL DEFAULT 0;
+
+ALTER TABLE flag_stats_archive
+    ADD COLUMN IF NOT EXISTS player_solves INT NOT NULL DEFAULT 0;
+
+UPDATE flag_stats s
+SET s.player_solves = (
+    SELECT COUNT(*)
+    FROM rewards r
+    INNER JOIN users u ON u.guild_id = r.guild_id AND u.id = r.user_id
+    WHERE r.guild_id = s.guild_id AND r.flag_id = s.flag_id AND u.permission != 1
+);
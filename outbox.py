@@ -0,0 +1,94 @@
+import io
+import asyncio
+import logging
+from time import monotonic
+from collections import deque
+
+import discord
+
+
+class Outbox:
+    """
+    Fila de envio de respostas por canal.
+
+    Os comandos apenas enfileiram a resposta e terminam; uma tarefa por canal faz o envio,
+    respeitando antecipadamente o limite de mensagens do canal (`rate` mensagens a cada `per`
+    segundos) e anexando como arquivo as respostas maiores que o limite de caracteres do discord.
+    Respostas a comandos de barra vão pelo webhook da interação, que não conta no limite do canal,
+    e são enviadas na hora.
+    """
+
+    def __init__(self, rate: int = 5, per: float = 5.0, limit: int = 2000, idle: float = 60.0):
+        self.rate = rate
+        self.per = per
+        self.limit = limit
+        self.idle = idle
+
+        self._queues: dict[int, asyncio.Queue] = {}
+        self._sent: dict[int, deque] = {}
+        self._logger = logging.getLogger("bot_logger")
+
+    def reply(self, ctx, *parts: str, **kwargs):
+        """
+        Enfileira uma resposta ao comando; as partes são unidas em uma única mensagem.
+
+        @type ctx: commands.Context
+        @param ctx: Contexto do comando a ser respondido.
+        @type parts: string
+        @param parts: Trechos da resposta, separados por quebra de linha.
+        """
+
+        content = "\n".join(part for part in parts if part)
+        channel_id = ctx.channel.id
+
+        if ctx.interaction is not None:
+            asyncio.get_running_loop().create_task(self._deliver(channel_id, ctx, content, kwargs))
+            return
+
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = asyncio.Queue()
+            asyncio.get_running_loop().create_task(self._worker(channel_id, queue))
+
+        queue.put_nowait((ctx, content, kwargs))
+
+    async def _wait_bucket(self, channel_id: int):
+        sent = self._sent.setdefault(channel_id, deque(maxlen=self.rate))
+
+        if len(sent) == self.rate:
+            delay = sent[0] + self.per - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        sent.append(monotonic())
+
+    async def _worker(self, channel_id: int, queue: asyncio.Queue):
+        while True:
+            try:
+                ctx, content, kwargs = await asyncio.wait_for(queue.get(), self.idle)
+            except asyncio.TimeoutError:
+                # Sem await entre a verificação e a remoção, nenhum envio é perdido
+                if queue.empty():
+                    del self._queues[channel_id]
+                    self._sent.pop(channel_id, None)
+                    return
+                continue
+
+            await self._wait_bucket(channel_id)
+            await self._deliver(channel_id, ctx, content, kwargs)
+
+    async def _deliver(self, channel_id: int, ctx, content: str, kwargs: dict):
+        try:
+            await self._send(ctx, content, kwargs)
+        except Exception:
+            self._logger.exception(f"Falha ao enviar resposta no canal {channel_id}")
+
+    async def _send(self, ctx, content: str, kwargs: dict):
+        if len(content) <= self.limit:
+            await ctx.reply(content, **kwargs)
+            return
+
+        # Respostas longas vão inteiras como anexo em vez de serem truncadas
+        text = content.replace("```", "").strip("\n")
+        attachment = discord.File(io.BytesIO(text.encode("utf-8")), filename="resposta.txt")
+        await ctx.reply("A resposta é longa demais e foi anexada como arquivo.", file=attachment, **kwargs)
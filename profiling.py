@@ -0,0 +1,179 @@
+import io
+import os
+import re
+import sys
+import asyncio
+import marshal
+import pstats
+import cProfile
+import threading
+from time import monotonic
+from collections import Counter, deque
+
+
+def folded_stack(frame) -> str:
+    """
+    Converte a pilha de um frame para o formato "folded" (da raiz até o frame, separado por `;`),
+    aceito por flamegraph.pl, speedscope e inferno.
+
+    @rtype: string
+    """
+
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+def _thread_names() -> dict[int, str]:
+    # Threads de um mesmo pool (fireuai_db_0, fireuai_db_1...) são agrupadas
+    return {thread.ident: re.sub(r"_\d+$", "", thread.name) for thread in threading.enumerate()}
+
+
+class SamplingProfiler:
+    """
+    Profiler por amostragem: a cada `interval` segundos registra a pilha de todas as threads.
+    Só existe custo enquanto a sessão está ativa; o resultado é o número de amostras por pilha.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling_profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """
+        Encerra a amostragem.
+
+        @rtype: string
+        @return: Pilhas no formato folded, uma por linha seguida do número de amostras
+        """
+
+        self._stopped.set()
+        self._thread.join()
+
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def _run(self):
+        own = threading.get_ident()
+        names = _thread_names()
+
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+
+                if thread_id not in names:
+                    names = _thread_names()
+
+                self.samples[f"{names.get(thread_id, thread_id)};{folded_stack(frame)}"] += 1
+
+
+class LoopProfiler:
+    """
+    Sessão do cProfile na thread do event loop, onde rodam os comandos e o discord.py.
+    Deve ser iniciada e encerrada dentro do event loop.
+    """
+
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+
+    def start(self):
+        self._profiler.enable()
+
+    def stop(self, top: int = 30) -> tuple[bytes, str]:
+        """
+        Encerra a sessão.
+
+        @type top: int
+        @param top: Quantidade de funções no resumo em texto.
+
+        @rtype: Tupla
+        @return: Estatísticas no formato do pstats (.prof, para snakeviz ou flameprof) e o resumo
+                 das funções com maior tempo acumulado
+        """
+
+        self._profiler.disable()
+        self._profiler.create_stats()
+
+        summary = io.StringIO()
+        pstats.Stats(self._profiler, stream=summary).sort_stats("cumulative").print_stats(top)
+
+        return marshal.dumps(self._profiler.stats), summary.getvalue()
+
+
+class LoopWatchdog:
+    """
+    Detecta bloqueios do event loop: uma tarefa no loop atualiza um batimento e uma thread separada
+    captura a pilha da thread do loop quando o batimento atrasa mais que `threshold` segundos.
+    Cada bloqueio é repassado a `on_block(duração, pilha)` ao terminar e guardado em `blocks`.
+    """
+
+    def __init__(self, on_block, threshold: float = 0.25, history: int = 100):
+        if threshold <= 0:
+            raise ValueError("O limite do watchdog deve ser maior que zero")
+
+        self.on_block = on_block
+        self.threshold = threshold
+        self.blocks: deque[tuple[float, str]] = deque(maxlen=history)
+
+        self._interval = threshold / 4
+        self._beat = monotonic()
+        self._stopped = threading.Event()
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        """Inicia o watchdog; deve ser chamado dentro do event loop a ser observado."""
+
+        loop_thread = threading.get_ident()
+        self._beat = monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._run, args=(loop_thread,), name="loop_watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """
+        Encerra o watchdog.
+
+        @rtype: string
+        @return: Pilhas dos bloqueios no formato folded, com a duração em milissegundos como peso
+        """
+
+        self._stopped.set()
+        self._task.cancel()
+        self._thread.join()
+
+        return "".join(f"{stack} {duration * 1000:.0f}\n" for duration, stack in self.blocks)
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = monotonic()
+            await asyncio.sleep(self._interval)
+
+    def _run(self, loop_thread: int):
+        blocked_beat, stack = None, None
+
+        while not self._stopped.wait(self._interval):
+            beat = self._beat
+
+            if blocked_beat is not None and beat != blocked_beat:
+                # O loop voltou a responder: a duração é o tempo entre os batimentos além do esperado
+                duration = beat - blocked_beat - self._interval
+                self.blocks.append((duration, stack))
+                self.on_block(duration, stack)
+                blocked_beat, stack = None, None
+
+            if blocked_beat is None and monotonic() - beat > self.threshold + self._interval:
+                frame = sys._current_frames().get(loop_thread)
+                if frame is not None:
+                    blocked_beat, stack = beat, folded_stack(frame)
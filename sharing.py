@@ -0,0 +1,108 @@
+from threading import Lock
+from itertools import combinations
+from collections import OrderedDict, deque
+
+
+class SharingDetector:
+    """
+    Detecta compartilhamento de flags analisando os resgates conforme são confirmados.
+
+    Para cada desafio é mantida uma janela deslizante com os resgates dos últimos `window` segundos.
+    Usuários que resgatam o mesmo desafio dentro da janela formam um grupo; cada par do grupo acumula
+    uma pontuação maior quanto mais próximos forem os resgates, e um grupo é reportado quando tem
+    `min_cluster` usuários ou quando algum par já foi visto junto em `min_repeats` desafios diferentes.
+    A memória é limitada: no máximo `max_flags` janelas, `max_per_flag` resgates por janela e
+    `max_pairs` pares, descartando os menos recentes.
+    """
+
+    def __init__(self, on_alert, window: float = 30.0, min_cluster: int = 3, min_repeats: int = 3,
+                 max_flags: int = 5000, max_per_flag: int = 50, max_pairs: int = 50000):
+        self.on_alert = on_alert
+        self.window = window
+        self.min_cluster = min_cluster
+        self.min_repeats = min_repeats
+        self.max_flags = max_flags
+        self.max_per_flag = max_per_flag
+        self.max_pairs = max_pairs
+
+        # flag_id -> deque[(solved_at, user_id)]
+        self._windows: OrderedDict[int, deque] = OrderedDict()
+        # (guild_id, user_a, user_b) -> [pontuação, desafios em comum]
+        self._pairs: OrderedDict[tuple[str, str, str], list] = OrderedDict()
+        # flag_id -> usuários já reportados, para não repetir o alerta do mesmo grupo
+        self._reported: OrderedDict[int, set[str]] = OrderedDict()
+        self._lock = Lock()
+
+    def _touch(self, table: OrderedDict, key, factory, limit: int):
+        value = table.get(key)
+        if value is None:
+            value = table[key] = factory()
+            if len(table) > limit:
+                table.popitem(last=False)
+        else:
+            table.move_to_end(key)
+        return value
+
+    def observe(self, guild_id: str, flag_id: int, challenge: str, user_id: str, solved_at: float):
+        """
+        Processa um resgate confirmado. Pode ser chamado de qualquer thread; o alerta é emitido
+        pela mesma thread através de `on_alert`.
+
+        @type guild_id: string
+        @param guild_id: Id do servidor do discord.
+        @type flag_id: int
+        @param flag_id: Id da flag resgatada.
+        @type challenge: string
+        @param challenge: Nome do desafio.
+        @type user_id: string
+        @param user_id: Id do usuário que resgatou.
+        @type solved_at: float
+        @param solved_at: Momento do resgate (timestamp em segundos).
+        """
+
+        with self._lock:
+            solves = self._touch(self._windows, flag_id, lambda: deque(maxlen=self.max_per_flag), self.max_flags)
+
+            while solves and solved_at - solves[0][0] > self.window:
+                solves.popleft()
+
+            solves.append((solved_at, user_id))
+
+            cluster = {user for _, user in solves}
+            if len(cluster) < 2:
+                return
+
+            # Pontua o novo resgate contra cada resgate anterior da janela
+            repeated = False
+            for other_at, other in solves:
+                if other == user_id:
+                    continue
+
+                pair = (guild_id, *sorted((user_id, other)))
+                stats = self._touch(self._pairs, pair, lambda: [0.0, 0], self.max_pairs)
+                stats[0] += 1.0 - (solved_at - other_at) / self.window
+                stats[1] += 1
+                repeated = repeated or stats[1] >= self.min_repeats
+
+            if len(cluster) < self.min_cluster and not repeated:
+                return
+
+            reported = self._touch(self._reported, flag_id, set, self.max_flags)
+            if cluster <= reported:
+                return
+            reported |= cluster
+
+            score = sum(
+                self._pairs.get((guild_id, *sorted(users)), (0.0, 0))[0]
+                for users in combinations(cluster, 2)
+            )
+
+            alert = {
+                "guild_id": guild_id,
+                "challenge": challenge,
+                "users": sorted(cluster),
+                "window": self.window,
+                "score": round(score, 2),
+            }
+
+        self.on_alert(alert)
@@ -0,0 +1,89 @@
+import sys
+import types
+import asyncio
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+# O agrupamento não depende do conector; sem o mariadb instalado basta um módulo vazio para o import
+if "mariadb" not in sys.modules:
+    try:
+        import mariadb  # noqa: F401
+    except ImportError:
+        sys.modules["mariadb"] = types.SimpleNamespace(ConnectionPool=lambda **kwargs: None)
+
+from database import Database, coalesce
+
+
+class _FakeDatabase(Database):
+    def __init__(self, error: Exception | None = None):
+        super().__init__("localhost", "user", "password", "database")
+        self.release = threading.Event()
+        self.executions = 0
+        self.error = error
+
+    @coalesce
+    def lookup(self, key: str):
+        self.executions += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return {"key": key}
+
+    def other(self):
+        return "other"
+
+
+async def _run_concurrently(database: _FakeDatabase, executor, callers: int = 50):
+    tasks = [asyncio.create_task(database.run(executor, database.lookup, "flag")) for _ in range(callers)]
+
+    # Os seguidores aguardam no event loop: outra chamada ainda encontra uma thread livre
+    await asyncio.sleep(0.05)
+    other = await asyncio.wait_for(database.run(executor, database.other), 1)
+
+    database.release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    return results, other
+
+
+class CoalesceTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+
+    def test_concurrent_calls_share_one_execution(self):
+        database = _FakeDatabase()
+        results, other = asyncio.run(_run_concurrently(database, self.executor))
+
+        self.assertEqual(other, "other")
+        self.assertEqual(database.executions, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(results[0], {"key": "flag"})
+        self.assertEqual(database.coalesce_stats()["lookup"], {"calls": 50, "queries": 1, "ratio": 50.0})
+
+    def test_error_is_propagated_to_every_caller(self):
+        error = RuntimeError("falha")
+        database = _FakeDatabase(error)
+        results, _ = asyncio.run(_run_concurrently(database, self.executor))
+
+        self.assertEqual(database.executions, 1)
+        self.assertTrue(all(result is error for result in results))
+
+    def test_sequential_calls_are_not_cached(self):
+        database = _FakeDatabase()
+        database.release.set()
+
+        async def sequential():
+            await database.run(self.executor, database.lookup, "flag")
+            await database.run(self.executor, database.lookup, "flag")
+
+        asyncio.run(sequential())
+
+        self.assertEqual(database.executions, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from config import Config, _convert, load_config
+
+
+class ConvertTest(unittest.TestCase):
+    def test_bool(self):
+        self.assertTrue(_convert("prefix_commands", "1"))
+        self.assertTrue(_convert("prefix_commands", "True"))
+        self.assertFalse(_convert("prefix_commands", "0"))
+        self.assertFalse(_convert("prefix_commands", False))
+
+    def test_tuple(self):
+        self.assertEqual(_convert("db_replicas", "a:3307, b ,"), ("a:3307", "b"))
+        self.assertEqual(_convert("db_replicas", ["a", "b"]), ("a", "b"))
+
+    def test_numbers_and_strings(self):
+        self.assertEqual(_convert("pool_size", "12"), 12)
+        self.assertEqual(_convert("max_lag", "2.5"), 2.5)
+        self.assertEqual(_convert("db_host", "db:3306"), "db:3306")
+
+        with self.assertRaises(ValueError):
+            _convert("pool_size", "muitos")
+
+
+class LoadConfigTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous = os.getcwd()
+        os.chdir(self.directory.name)
+
+        self.environ = mock.patch.dict(os.environ, clear=True)
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        os.chdir(self.previous)
+        self.directory.cleanup()
+
+    def write(self, name: str, content: str):
+        with open(name, "w", encoding="utf-8") as file:
+            file.write(content)
+
+    def test_defaults(self):
+        self.assertEqual(load_config(), Config())
+
+    def test_environment_wins_over_dotenv(self):
+        self.write(".env", "DB_PASSWORD=antiga\nDB_HOST=dotenv-host\n")
+        os.environ["DB_PASSWORD"] = "nova"
+
+        config = load_config()
+
+        self.assertEqual(config.db_password, "nova")
+        self.assertEqual(config.db_host, "dotenv-host")
+
+    def test_file_wins_over_environment(self):
+        self.write("config.json", json.dumps({"pool_size": 20, "db_replicas": ["r1"]}))
+        os.environ["DB_POOL_SIZE"] = "5"
+
+        config = load_config()
+
+        self.assertEqual(config.pool_size, 20)
+        self.assertEqual(config.db_replicas, ("r1",))
+
+    def test_config_path_from_dotenv(self):
+        self.write(".env", "FIREUAI_CONFIG=outro.json\n")
+        self.write("outro.json", json.dumps({"late_days": 3}))
+
+        self.assertEqual(load_config().late_days, 3)
+
+    def test_unknown_fields_are_rejected(self):
+        self.write("config.json", json.dumps({"pool_sise": 20}))
+
+        with self.assertRaises(ValueError):
+            load_config()
+
+
+if __name__ == "__main__":
+    unittest.main()
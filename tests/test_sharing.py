@@ -0,0 +1,77 @@
+import unittest
+
+from sharing import SharingDetector
+
+
+class SharingDetectorTest(unittest.TestCase):
+    def make_detector(self, **kwargs) -> SharingDetector:
+        self.alerts = []
+        return SharingDetector(self.alerts.append, **kwargs)
+
+    def test_min_cluster_alert(self):
+        detector = self.make_detector(window=30, min_cluster=3)
+
+        detector.observe("g", 1, "web", "a", 0)
+        detector.observe("g", 1, "web", "b", 5)
+        self.assertEqual(self.alerts, [])
+
+        detector.observe("g", 1, "web", "c", 10)
+        self.assertEqual(len(self.alerts), 1)
+        self.assertEqual(self.alerts[0]["users"], ["a", "b", "c"])
+        self.assertEqual(self.alerts[0]["challenge"], "web")
+        self.assertGreater(self.alerts[0]["score"], 0)
+
+    def test_repeated_pair_alert(self):
+        detector = self.make_detector(window=30, min_cluster=10, min_repeats=2)
+
+        detector.observe("g", 1, "web", "a", 0)
+        detector.observe("g", 1, "web", "b", 2)
+        self.assertEqual(self.alerts, [])
+
+        detector.observe("g", 2, "pwn", "a", 100)
+        detector.observe("g", 2, "pwn", "b", 101)
+        self.assertEqual(len(self.alerts), 1)
+        self.assertEqual(self.alerts[0]["challenge"], "pwn")
+        self.assertEqual(self.alerts[0]["users"], ["a", "b"])
+
+    def test_solves_outside_the_window_expire(self):
+        detector = self.make_detector(window=30, min_cluster=2)
+
+        detector.observe("g", 1, "web", "a", 0)
+        detector.observe("g", 1, "web", "b", 31)
+        self.assertEqual(self.alerts, [])
+        self.assertEqual(list(detector._windows[1]), [(31, "b")])
+
+    def test_same_cluster_is_not_reported_twice(self):
+        detector = self.make_detector(window=30, min_cluster=2, min_repeats=100)
+
+        detector.observe("g", 1, "web", "a", 0)
+        detector.observe("g", 1, "web", "b", 1)
+        detector.observe("g", 1, "web", "a", 2)
+        self.assertEqual(len(self.alerts), 1)
+
+        detector.observe("g", 1, "web", "c", 3)
+        self.assertEqual(len(self.alerts), 2)
+        self.assertEqual(self.alerts[1]["users"], ["a", "b", "c"])
+
+    def test_windows_are_evicted_at_max_flags(self):
+        detector = self.make_detector(max_flags=2)
+
+        for flag_id in (1, 2, 3):
+            detector.observe("g", flag_id, f"c{flag_id}", "a", flag_id)
+
+        self.assertEqual(list(detector._windows), [2, 3])
+
+    def test_pairs_are_evicted_at_max_pairs(self):
+        detector = self.make_detector(max_pairs=1, min_cluster=10)
+
+        detector.observe("g", 1, "web", "a", 0)
+        detector.observe("g", 1, "web", "b", 1)
+        detector.observe("g", 2, "pwn", "c", 2)
+        detector.observe("g", 2, "pwn", "d", 3)
+
+        self.assertEqual(list(detector._pairs), [("g", "c", "d")])
+
+
+if __name__ == "__main__":
+    unittest.main()